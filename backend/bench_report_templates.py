@@ -0,0 +1,69 @@
+import argparse
+import time
+import timeit
+
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import TableStyle
+
+import report_pdf
+
+# Per-report setup cost of the guardian report: the styles and table styles
+# every render used to rebuild, against the shared template.
+
+SAMPLE_DATA = {
+    'student': {'id': 'bench', 'full_name': 'Ayşe Çelik', 'grade': '9. Sınıf'},
+    'lessons': [
+        {'day_of_week': i % 7, 'start_time': '10:00', 'end_time': '11:00',
+         'topic': 'Türev', 'status': 'completed', 'note': 'İyi gidiyor'}
+        for i in range(20)
+    ],
+    'sessions': [
+        {'date': f'2025-01-{i + 1:02d}', 'topic': 'Fonksiyonlar', 'evaluation': 'Eksikler: -\nÖdev: Test 3'}
+        for i in range(30)
+    ],
+    'totals': {'Ödendi': 1500.0, 'Beklemede': 300.0},
+    'start_date': '2025-01-01',
+    'end_date': '2025-01-31'
+}
+
+def per_report_setup():
+    # What each render built before the template layer
+    styles = getSampleStyleSheet()
+    ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontName='DejaVuSans', fontSize=20,
+                   textColor=colors.HexColor('#9333ea'), spaceAfter=30, alignment=1)
+    ParagraphStyle('CustomNormal', parent=styles['Normal'], fontName='DejaVuSans', fontSize=10)
+    for header_color in ('#9333ea', '#db2777'):
+        TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(header_color)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'DejaVuSans'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+
+def _per_call_us(fn, number: int) -> float:
+    return timeit.timeit(fn, number=number) / number * 1e6
+
+def main(number: int, renders: int):
+    started = time.perf_counter()
+    report_pdf.get_report_template()
+    first_use_ms = (time.perf_counter() - started) * 1000
+
+    print(f"template first use (fonts + styles, once per process): {first_use_ms:.2f} ms")
+    print(f"per-report setup, rebuilt every render:  {_per_call_us(per_report_setup, number):8.1f} us")
+    print(f"per-report setup, shared template:       {_per_call_us(report_pdf.get_report_template, number):8.1f} us")
+
+    report_pdf.render_report_pdf(SAMPLE_DATA)
+    render_ms = timeit.timeit(lambda: report_pdf.render_report_pdf(SAMPLE_DATA), number=renders) / renders * 1000
+    print(f"full render (20 lessons, 30 sessions):   {render_ms:8.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure per-report PDF setup cost")
+    parser.add_argument('--number', type=int, default=2000, help="setup iterations")
+    parser.add_argument('--renders', type=int, default=50, help="full render iterations")
+    args = parser.parse_args()
+    main(args.number, args.renders)
@@ -0,0 +1,24 @@
+import argparse
+import asyncio
+import json
+
+from server import db, client, apply_index_registry, build_index_report
+
+async def main(apply: bool):
+    if apply:
+        await apply_index_registry(db)
+        print("Index registry applied.")
+    
+    report = await build_index_report(db)
+    if not report:
+        print("All collections match the index registry.")
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the index registry with the live MongoDB indexes")
+    parser.add_argument('--apply', action='store_true', help="create missing registry indexes before reporting")
+    args = parser.parse_args()
+    asyncio.run(main(args.apply))
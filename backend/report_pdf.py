@@ -0,0 +1,177 @@
+import io
+import logging
+import threading
+from pathlib import Path
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.lib.units import cm
+
+# PDF rendering for student reports. Kept free of server imports so report
+# worker processes only load ReportLab, not the API app.
+
+logger = logging.getLogger(__name__)
+
+font_path = Path(__file__).parent / 'static' / 'fonts' / 'DejaVuSans.ttf'
+
+def _register_fonts() -> str:
+    # Register the Turkish font; returns the font family the report uses
+    try:
+        if font_path.exists():
+            pdfmetrics.registerFont(TTFont('DejaVuSans', str(font_path)))
+            return 'DejaVuSans'
+    except Exception as e:
+        logger.warning(f"Could not load Turkish font: {e}. Using default font.")
+    return 'Helvetica'
+
+def _table_style(header_color: str, font: str) -> TableStyle:
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(header_color)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), font),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+
+class ReportTemplate:
+    """
+    Fonts, paragraph styles and table styles of the guardian report. Built
+    once per process on first use and shared by every render; none of these
+    objects are mutated while a document is built.
+    """
+    def __init__(self):
+        self.font = _register_fonts()
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontName=self.font,
+            fontSize=20,
+            textColor=colors.HexColor('#9333ea'),
+            spaceAfter=30,
+            alignment=1  # Center
+        )
+        self.normal_style = ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontName=self.font,
+            fontSize=10
+        )
+        self.lesson_table_style = _table_style('#9333ea', self.font)
+        self.session_table_style = _table_style('#db2777', self.font)
+
+_template = None
+_template_lock = threading.Lock()
+
+def get_report_template() -> ReportTemplate:
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = ReportTemplate()
+    return _template
+
+def render_report_pdf(data: dict) -> bytes:
+    """
+    Build the guardian report from plain data (student, lessons, sessions,
+    start_date, end_date and payment totals by status) and return the PDF.
+    """
+    student = data['student']
+    lessons = data['lessons']
+    sessions = data['sessions']
+    totals = data['totals']
+    start_date, end_date = data['start_date'], data['end_date']
+    
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    
+    template = get_report_template()
+    title_style = template.title_style
+    normal_style = template.normal_style
+    
+    # Title
+    title = Paragraph(f"Veli Raporu — {student['full_name']}", title_style)
+    elements.append(title)
+    
+    # Date range
+    date_text = Paragraph(f"Tarih Aralığı: {start_date} - {end_date}", normal_style)
+    elements.append(date_text)
+    elements.append(Spacer(1, 0.5*cm))
+    
+    # Student info
+    info_text = Paragraph(f"<b>Öğrenci:</b> {student['full_name']}<br/><b>Sınıf:</b> {student.get('grade', 'Belirtilmemiş')}", normal_style)
+    elements.append(info_text)
+    elements.append(Spacer(1, 0.5*cm))
+    
+    # Lessons table
+    if lessons:
+        elements.append(Paragraph("<b>Dersler ve Notlar</b>", normal_style))
+        elements.append(Spacer(1, 0.3*cm))
+        
+        lesson_data = [['Gün', 'Saat', 'Konu', 'Durum', 'Not']]
+        days = ['Pazartesi', 'Salı', 'Çarşamba', 'Perşembe', 'Cuma', 'Cumartesi', 'Pazar']
+        
+        for lesson in lessons:
+            status_text = ''
+            if lesson['status'] == 'completed':
+                status_text = 'Tamamlandı'
+            elif lesson['status'] == 'not_attended':
+                status_text = 'Yapılmadı'
+            elif lesson['status'] == 'cancelled':
+                status_text = 'İptal'
+            else:
+                status_text = 'Planlandı'
+                
+            lesson_data.append([
+                days[lesson['day_of_week']],
+                f"{lesson['start_time']}-{lesson['end_time']}",
+                lesson.get('topic', '-'),
+                status_text,
+                lesson.get('note', '-')
+            ])
+        
+        lesson_table = Table(lesson_data, colWidths=[2.5*cm, 2.5*cm, 4*cm, 2.5*cm, 5*cm])
+        lesson_table.setStyle(template.lesson_table_style)
+        elements.append(lesson_table)
+        elements.append(Spacer(1, 0.5*cm))
+    
+    # Sessions table
+    if sessions:
+        elements.append(Paragraph("<b>Ders Detayları</b>", normal_style))
+        elements.append(Spacer(1, 0.3*cm))
+        
+        session_data = [['Tarih', 'Konu', 'Değerlendirme']]
+        for session in sessions:
+            session_data.append([
+                session['date'],
+                session.get('topic', '-'),
+                session.get('evaluation', '-')
+            ])
+        
+        session_table = Table(session_data, colWidths=[3*cm, 7*cm, 7*cm])
+        session_table.setStyle(template.session_table_style)
+        elements.append(session_table)
+        elements.append(Spacer(1, 0.5*cm))
+    
+    # Summary
+    total_lessons = len([l for l in lessons if l['status'] in ['completed', 'not_attended']])
+    total_paid = totals.get('Ödendi', 0)
+    total_pending = totals.get('Beklemede', 0)
+    
+    summary_text = f"""<b>Özet</b><br/>
+    Toplam Ders: {total_lessons}<br/>
+    Ödenen: {total_paid} TL<br/>
+    Bekleyen: {total_pending} TL
+    """
+    elements.append(Paragraph(summary_text, normal_style))
+    
+    doc.build(elements)
+    return buffer.getvalue()
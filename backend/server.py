@@ -1,32 +1,47 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel, Field, EmailStr, ConfigDict
 from typing import List, Optional
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone, timedelta, date
 from pathlib import Path
 from dotenv import load_dotenv
 import os
 import logging
 import uuid
+import re
+import json
+import base64
+import hashlib
+import secrets
 import bcrypt
 import jwt
 from authlib.integrations.starlette_client import OAuth
 from itsdangerous import URLSafeTimedSerializer
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+from fastapi_mail import ConnectionConfig
+import aiosmtplib
+from email.message import EmailMessage
 import aiofiles
-import io
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import cm
+import numpy as np
+from report_pdf import render_report_pdf
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne, ReplaceOne
+from pymongo.errors import DuplicateKeyError
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+import multiprocessing
+import bisect
+import heapq
+import random
+import threading
+import time
+import zipfile
+from functools import lru_cache
+from zoneinfo import ZoneInfo
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +58,53 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24 * 30  # 30 days
 
+# Authenticated user cache
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', 60))
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', 10000))
+
+# Password hashing pool (bcrypt runs off the event loop)
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', 4))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 64))
+
+# PDF report rendering (process pool)
+REPORT_RENDER_WORKERS = int(os.environ.get('REPORT_RENDER_WORKERS', 2))
+REPORT_RENDER_MAX_QUEUE = int(os.environ.get('REPORT_RENDER_MAX_QUEUE', 32))
+REPORT_RENDER_PER_TEACHER = int(os.environ.get('REPORT_RENDER_PER_TEACHER', 2))
+REPORT_CACHE_DIR = Path(os.environ.get('REPORT_CACHE_DIR', str(ROOT_DIR / 'report_cache')))
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+REPORT_BULK_PREFETCH = int(os.environ.get('REPORT_BULK_PREFETCH', 4))
+REPORT_ZIP_CHUNK_BYTES = 64 * 1024
+
+USERNAME_ALLOCATION_ATTEMPTS = 5
+
+# Lesson conflict index
+SCHEDULE_INDEX_TTL_SECONDS = float(os.environ.get('SCHEDULE_INDEX_TTL_SECONDS', 30))
+SCHEDULE_INDEX_MAX_SIZE = int(os.environ.get('SCHEDULE_INDEX_MAX_SIZE', 5000))
+
+# Optimistic lesson booking (per teacher, weekday and time bucket)
+SCHEDULE_VERSION_BUCKET_MINUTES = int(os.environ.get('SCHEDULE_VERSION_BUCKET_MINUTES', 60))
+BOOKING_MAX_ATTEMPTS = int(os.environ.get('BOOKING_MAX_ATTEMPTS', 20))
+BOOKING_RETRY_BASE_SECONDS = float(os.environ.get('BOOKING_RETRY_BASE_SECONDS', 0.005))
+BOOKING_HOLD_TTL_SECONDS = float(os.environ.get('BOOKING_HOLD_TTL_SECONDS', 60))  # holds left by a crashed request
+
+# Cross-teacher availability bitmaps
+AVAILABILITY_BUCKET_MINUTES = int(os.environ.get('AVAILABILITY_BUCKET_MINUTES', 5))
+AVAILABILITY_BUCKETS = 24 * 60 // AVAILABILITY_BUCKET_MINUTES
+
+# Lesson override archive
+OVERRIDE_ARCHIVE_ENABLED = os.environ.get('OVERRIDE_ARCHIVE_ENABLED', 'true').lower() == 'true'
+OVERRIDE_ARCHIVE_AFTER_WEEKS = int(os.environ.get('OVERRIDE_ARCHIVE_AFTER_WEEKS', 8))
+OVERRIDE_ARCHIVE_BATCH_SIZE = int(os.environ.get('OVERRIDE_ARCHIVE_BATCH_SIZE', 500))
+OVERRIDE_ARCHIVE_INTERVAL_SECONDS = float(os.environ.get('OVERRIDE_ARCHIVE_INTERVAL_SECONDS', 3600))
+
+# Calendar
+CALENDAR_MAX_DAYS = int(os.environ.get('CALENDAR_MAX_DAYS', 93))
+CALENDAR_TZ = os.environ.get('CALENDAR_TZ', 'Europe/Istanbul')
+ICS_CACHE_MAX_SIZE = int(os.environ.get('ICS_CACHE_MAX_SIZE', 1000))
+
+# List endpoint pagination; also the page size when no limit is given
+PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', 1000))
+
 # Email Configuration
 conf = ConnectionConfig(
     MAIL_USERNAME=os.environ.get('MAIL_USERNAME'),
@@ -50,12 +112,22 @@ conf = ConnectionConfig(
     MAIL_FROM=os.environ.get('MAIL_FROM'),
     MAIL_PORT=int(os.environ.get('MAIL_PORT', 587)),
     MAIL_SERVER=os.environ.get('MAIL_SERVER'),
-    MAIL_STARTTLS=True,
+    MAIL_STARTTLS=os.environ.get('MAIL_STARTTLS', 'true').lower() == 'true',
     MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True
+    USE_CREDENTIALS=os.environ.get('MAIL_USE_CREDENTIALS', 'true').lower() == 'true'
 )
 
-fastmail = FastMail(conf)
+# Email outbox worker. Every process with the worker enabled drains on its
+# own connection and with its own rate budget; enable it in one designated
+# process (EMAIL_OUTBOX_ENABLED=false elsewhere) for a single SMTP
+# connection and a global send rate.
+EMAIL_OUTBOX_ENABLED = os.environ.get('EMAIL_OUTBOX_ENABLED', 'true').lower() == 'true'
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 20))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 6))
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = float(os.environ.get('EMAIL_OUTBOX_RETRY_BASE_SECONDS', 30))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.environ.get('EMAIL_OUTBOX_POLL_SECONDS', 5))
+EMAIL_OUTBOX_RETENTION_DAYS = float(os.environ.get('EMAIL_OUTBOX_RETENTION_DAYS', 30))  # sent/dead entries
+EMAIL_OUTBOX_RATE_PER_SECOND = float(os.environ.get('EMAIL_OUTBOX_RATE_PER_SECOND', 5))  # bulk mail only; 0: unthrottled
 
 # Password Reset Serializer
 serializer = URLSafeTimedSerializer(JWT_SECRET)
@@ -70,14 +142,6 @@ oauth.register(
     client_kwargs={'scope': 'openid email profile'}
 )
 
-# Register Turkish font for PDF
-font_path = ROOT_DIR / 'static' / 'fonts' / 'DejaVuSans.ttf'
-try:
-    if font_path.exists():
-        pdfmetrics.registerFont(TTFont('DejaVuSans', str(font_path)))
-except Exception as e:
-    logger.warning(f"Could not load Turkish font: {e}. Using default font.")
-
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -147,6 +211,30 @@ class Lesson(LessonBase):
     teacher_id: str
     created_at: str
 
+class LessonBulkCreate(BaseModel):
+    lessons: List[LessonCreate] = Field(min_length=1, max_length=100)
+
+class AvailabilitySlot(BaseModel):
+    day_of_week: Optional[int] = Field(None, ge=0, le=6)
+    date: Optional[str] = None  # YYYY-MM-DD; also checks overrides moved onto that date
+    start_time: str
+    end_time: str
+
+class AvailabilityQuery(BaseModel):
+    slots: List[AvailabilitySlot] = Field(min_length=1, max_length=50)
+    match: str = "all"  # all: free in every slot, any: free in at least one
+    subject: Optional[str] = None
+
+class LessonCompletion(BaseModel):
+    lesson_id: str
+    topic: str = ""
+    weaknesses: str = ""
+    homework: str = ""
+    note: str = ""
+
+class LessonCompleteBatch(BaseModel):
+    completions: List[LessonCompletion] = Field(min_length=1, max_length=100)
+
 class SessionBase(BaseModel):
     lesson_id: str
     student_id: str
@@ -183,6 +271,11 @@ class Payment(PaymentBase):
     teacher_id: str
     created_at: str
 
+class ReportBulkRequest(BaseModel):
+    start_date: str
+    end_date: str
+    student_ids: Optional[List[str]] = None  # None: all of the teacher's students
+
 class ForgotPasswordRequest(BaseModel):
     email: EmailStr
 
@@ -217,6 +310,8 @@ class Post(PostBase):
     author_name: str
     author_username: Optional[str] = None
     author_avatar: Optional[str] = None
+    likes_count: int = 0
+    comments_count: int = 0
     created_at: str
 
 class NewsBase(BaseModel):
@@ -233,6 +328,8 @@ class News(NewsBase):
     id: str
     author_id: str
     published_at: Optional[str] = None
+    likes_count: int = 0
+    comments_count: int = 0
     created_at: str
     updated_at: str
 
@@ -333,6 +430,9 @@ def _to_minutes(hhmm: str) -> int:
     h, m = map(int, hhmm.split(":"))
     return h * 60 + m
 
+def _to_hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
 def _iso_week_key(date_str: str) -> str:
     d = datetime.strptime(date_str, "%Y-%m-%d").date()
     y, w, _ = d.isocalendar()  # (year, week, weekday)
@@ -341,6 +441,300 @@ def _iso_week_key(date_str: str) -> str:
 def _same_iso_week(date_a: str, date_b: str) -> bool:
     return _iso_week_key(date_a) == _iso_week_key(date_b)
 
+def _encode_cursor(position: dict) -> str:
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(position, dict):
+            raise ValueError(cursor)
+        return position
+    except Exception:
+        raise HTTPException(status_code=400, detail="Geçersiz sayfalama imleci")
+
+async def _paginate(collection, query: dict, response: Response,
+                    limit: Optional[int], cursor: Optional[str]) -> list:
+    """
+    Keyset pagination over (created_at, id). When a page is cut short the
+    next cursor is returned in the X-Next-Cursor header. Without a limit a
+    page of PAGE_SIZE_MAX is returned, never the unbounded result set.
+    """
+    if limit is None:
+        limit = PAGE_SIZE_MAX
+    if cursor:
+        after = _decode_cursor(cursor)
+        query = {**query, '$or': [
+            {'created_at': {'$gt': after.get('created_at')}},
+            {'created_at': after.get('created_at'), 'id': {'$gt': after.get('id')}}
+        ]}
+    find_cursor = collection.find(query, {'_id': 0}).sort([('created_at', 1), ('id', 1)])
+    docs = await find_cursor.limit(limit + 1).to_list(limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers['X-Next-Cursor'] = _encode_cursor({'created_at': docs[-1]['created_at'], 'id': docs[-1]['id']})
+    return docs
+
+class _IntervalSet:
+    """
+    Sorted minute ranges with a running max of end times, so an overlap
+    lookup is a bisect plus a walk over the (few) candidates that can
+    still reach the probe.
+    """
+    def __init__(self, intervals):
+        # intervals: (start_min, end_min, key, start_time, end_time)
+        self.items = sorted(intervals)
+        self.starts = [item[0] for item in self.items]
+        self.max_ends = []
+        running = -1
+        for item in self.items:
+            running = max(running, item[1])
+            self.max_ends.append(running)
+
+    def find_overlap(self, start_min: int, end_min: int, exclude_key: Optional[str] = None):
+        j = bisect.bisect_left(self.starts, end_min) - 1  # items[:j+1] start before end_min
+        while j >= 0 and self.max_ends[j] > start_min:
+            item = self.items[j]
+            if item[1] > start_min and item[2] != exclude_key:
+                return item
+            j -= 1
+        return None
+
+_EMPTY_INTERVAL_SET = _IntervalSet([])
+
+def _hold_cutoff() -> str:
+    # Holds taken before this are abandoned and no longer occupy their slot
+    return (datetime.now(timezone.utc) - timedelta(seconds=BOOKING_HOLD_TTL_SECONDS)).isoformat()
+
+class _TeacherSchedule:
+    def __init__(self, lessons: List[dict], loaded_at: float, version: Optional[int] = None):
+        self.loaded_at = loaded_at
+        self.version = version
+        hold_cutoff = _hold_cutoff()
+        by_weekday = {}
+        for lesson in lessons:
+            by_weekday.setdefault(lesson['day_of_week'], []).append((
+                _to_minutes(lesson['start_time']), _to_minutes(lesson['end_time']),
+                lesson['id'], lesson['start_time'], lesson['end_time']
+            ))
+            hold = lesson.get('hold')
+            if hold and hold.get('held_at', '') >= hold_cutoff:
+                # target slot of a move that has not committed yet
+                by_weekday.setdefault(hold['day_of_week'], []).append((
+                    hold['start_min'], hold['end_min'],
+                    lesson['id'], _to_hhmm(hold['start_min']), _to_hhmm(hold['end_min'])
+                ))
+        self.weekly = {day: _IntervalSet(items) for day, items in by_weekday.items()}
+        self.by_date = {}  # YYYY-MM-DD -> _IntervalSet of overrides moved to that date
+
+    def lessons_on(self, weekday: int) -> _IntervalSet:
+        return self.weekly.get(weekday) or _EMPTY_INTERVAL_SET
+
+class _ScheduleIndexCache:
+    """
+    Per-teacher weekly interval index behind the free-slot finder and bulk
+    lesson creation. Weekly lessons load on first use, override dates load
+    lazily. Every lesson/override write goes through _schedule_changed()
+    or the booker, which drop the teacher's entry; the TTL bounds staleness
+    from writes made by other API processes, and callers that need an exact
+    snapshot pass the schedule version they read.
+    """
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries = OrderedDict()  # teacher_id -> _TeacherSchedule
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, teacher_id: str, version: Optional[int] = None) -> _TeacherSchedule:
+        # With a schedule version (read by the caller before this call) the
+        # entry is only reused if it was built at exactly that version
+        schedule = self._entries.get(teacher_id)
+        if (schedule is not None and schedule.loaded_at + self.ttl_seconds > time.monotonic()
+                and (version is None or schedule.version == version)):
+            self._entries.move_to_end(teacher_id)
+            self.hits += 1
+            return schedule
+
+        self.misses += 1
+        lessons = await db.lessons.find(
+            {'teacher_id': teacher_id},
+            {'_id': 0, 'id': 1, 'day_of_week': 1, 'start_time': 1, 'end_time': 1, 'hold': 1}
+        ).to_list(None)
+        schedule = _TeacherSchedule(lessons, time.monotonic(), version)
+        self._entries[teacher_id] = schedule
+        self._entries.move_to_end(teacher_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return schedule
+
+    async def overrides_between(self, teacher_id: str, dates: List[str]) -> dict:
+        # Override intervals per date; one $in query for the dates not cached yet
+        schedule = await self.get(teacher_id)
+        missing = [d for d in dates if d not in schedule.by_date]
+        if missing:
+            grouped = {d: [] for d in missing}
+            overrides = await _find_overrides(
+                {'teacher_id': teacher_id, 'new_date': {'$in': missing}},
+                {'_id': 0, 'lesson_id': 1, 'new_date': 1, 'new_start_time': 1, 'new_end_time': 1},
+                [_iso_week_key(d) for d in missing]
+            )
+            for ov in overrides:
+                grouped[ov['new_date']].append((
+                    _to_minutes(ov['new_start_time']), _to_minutes(ov['new_end_time']),
+                    ov['lesson_id'], ov['new_start_time'], ov['new_end_time']
+                ))
+            for d, items in grouped.items():
+                schedule.by_date[d] = _IntervalSet(items)
+        return {d: schedule.by_date[d] for d in dates}
+
+    def invalidate(self, teacher_id: str) -> None:
+        self._entries.pop(teacher_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+schedule_index = _ScheduleIndexCache(SCHEDULE_INDEX_TTL_SECONDS, SCHEDULE_INDEX_MAX_SIZE)
+
+async def _schedule_changed(teacher_id: str) -> None:
+    # Drop the cached interval index and bump the per-teacher schedule
+    # version that calendar ETags are derived from
+    schedule_index.invalidate(teacher_id)
+    availability_index.mark_stale(teacher_id)
+    await db.schedule_versions.update_one({'_id': teacher_id}, {'$inc': {'version': 1}}, upsert=True)
+
+def _override_archive_cutoff() -> str:
+    # Overrides of ISO weeks before this key are eligible for the archive
+    cutoff = datetime.now(timezone.utc) - timedelta(weeks=OVERRIDE_ARCHIVE_AFTER_WEEKS)
+    return _iso_week_key(cutoff.strftime('%Y-%m-%d'))
+
+def _reads_archive(week_keys: Optional[List[str]]) -> bool:
+    return not week_keys or min(week_keys) < _override_archive_cutoff()
+
+async def _find_overrides(query: dict, projection: dict, week_keys: Optional[List[str]] = None) -> List[dict]:
+    """
+    Overrides matching query from the hot collection, falling through to
+    lesson_overrides_archive when any of week_keys (or, without week_keys,
+    any week at all) may already have been archived.
+    """
+    if any(value for field, value in projection.items() if field != '_id'):
+        projection = {**projection, 'id': 1}  # needed to drop duplicates below
+    reads = [db.lesson_overrides.find(query, projection).to_list(None)]
+    if _reads_archive(week_keys):
+        reads.append(db.lesson_overrides_archive.find(query, projection).to_list(None))
+    seen = set()
+    overrides = []
+    for docs in await asyncio.gather(*reads):
+        for doc in docs:
+            # a document is briefly in both while the archiver moves it
+            if doc['id'] not in seen:
+                seen.add(doc['id'])
+                overrides.append(doc)
+    return overrides
+
+async def _find_override(query: dict, projection: dict, week_key: str) -> Optional[dict]:
+    override = await db.lesson_overrides.find_one(query, projection)
+    if override is None and _reads_archive([week_key]):
+        override = await db.lesson_overrides_archive.find_one(query, projection)
+    return override
+
+async def archive_lesson_overrides(database, batch_size: int = 500) -> int:
+    """
+    Move overrides of weeks before the archive cutoff into
+    lesson_overrides_archive in batches. Each batch is upserted into the
+    archive before it is deleted from the hot collection, so an interrupted
+    run only leaves copies that the next run (and readers) reconcile.
+    """
+    cutoff = _override_archive_cutoff()
+    moved = 0
+    while True:
+        batch = await database.lesson_overrides.find(
+            {'week_key': {'$lt': cutoff}}, {'_id': 0}
+        ).sort('week_key', 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        await database.lesson_overrides_archive.bulk_write(
+            [ReplaceOne({'id': doc['id']}, doc, upsert=True) for doc in batch], ordered=False
+        )
+        result = await database.lesson_overrides.delete_many({'id': {'$in': [doc['id'] for doc in batch]}})
+        moved += result.deleted_count
+        if len(batch) < batch_size:
+            break
+    override_archive_stats['runs'] += 1
+    override_archive_stats['archived'] += moved
+    override_archive_stats['last_cutoff'] = cutoff
+    return moved
+
+override_archive_stats = {"runs": 0, "archived": 0, "last_cutoff": None}
+
+async def _run_override_archiver() -> None:
+    while True:
+        try:
+            moved = await archive_lesson_overrides(db, OVERRIDE_ARCHIVE_BATCH_SIZE)
+            if moved:
+                logger.info(f"Archived {moved} lesson overrides")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Lesson override archiving failed: {e}")
+        await asyncio.sleep(OVERRIDE_ARCHIVE_INTERVAL_SECONDS)
+
+async def _student_data_changed(*student_ids: str) -> None:
+    # Bump data_version on the students whose lessons, sessions or payments
+    # changed; cached reports are keyed by it
+    ids = list({student_id for student_id in student_ids if student_id})
+    if ids:
+        await db.students.update_many({'id': {'$in': ids}}, {'$inc': {'data_version': 1}})
+
+def _with_minutes(lesson_dict: dict) -> dict:
+    lesson_dict['start_min'] = _to_minutes(lesson_dict['start_time'])
+    lesson_dict['end_min'] = _to_minutes(lesson_dict['end_time'])
+    return lesson_dict
+
+async def _find_lesson_conflict(teacher_id: str, day_of_week: int, start_min: int, end_min: int,
+                                exclude_lesson_id: Optional[str] = None):
+    # overlap if (start < ex_end) and (end > ex_start); one indexed probe, limit 1.
+    # A lesson being moved also holds its target slot until the move commits.
+    query = {
+        'teacher_id': teacher_id,
+        '$or': [
+            {'day_of_week': day_of_week, 'start_min': {'$lt': end_min}, 'end_min': {'$gt': start_min}},
+            {'hold.day_of_week': day_of_week, 'hold.start_min': {'$lt': end_min}, 'hold.end_min': {'$gt': start_min},
+             'hold.held_at': {'$gte': _hold_cutoff()}}
+        ]
+    }
+    if exclude_lesson_id:
+        query['id'] = {'$ne': exclude_lesson_id}
+    conflict = await db.lessons.find_one(
+        query, {'_id': 0, 'id': 1, 'day_of_week': 1, 'start_min': 1, 'end_min': 1, 'start_time': 1, 'end_time': 1, 'hold': 1}
+    )
+    if conflict and not (conflict['day_of_week'] == day_of_week
+                         and conflict['start_min'] < end_min and conflict['end_min'] > start_min):
+        # matched through the hold only
+        conflict['start_time'] = _to_hhmm(conflict['hold']['start_min'])
+        conflict['end_time'] = _to_hhmm(conflict['hold']['end_min'])
+    return conflict
+
+async def _find_override_conflict(teacher_id: str, date_str: str, start_min: int, end_min: int,
+                                  exclude_lesson_id: Optional[str] = None):
+    query = {
+        'teacher_id': teacher_id,
+        'new_date': date_str,
+        'new_start_min': {'$lt': end_min},
+        'new_end_min': {'$gt': start_min}
+    }
+    if exclude_lesson_id:
+        # the same lesson may have the same override (ignore self)
+        query['lesson_id'] = {'$ne': exclude_lesson_id}
+    return await _find_override(query, {'_id': 0, 'id': 1, 'new_start_time': 1, 'new_end_time': 1}, _iso_week_key(date_str))
+
 async def _has_time_conflict_for_teacher(db, teacher_id: str, target_date: str,
                                          start_time: str, end_time: str,
                                          exclude_lesson_id: Optional[str] = None) -> bool:
@@ -358,38 +752,336 @@ async def _has_time_conflict_for_teacher(db, teacher_id: str, target_date: str,
     # weekday: 0=Monday ... 6=Sunday
     weekday = datetime.strptime(target_date, "%Y-%m-%d").weekday()
 
-    # Check regular lessons on that weekday
-    q_lessons = {
-        "teacher_id": teacher_id,
-        "day_of_week": weekday
-    }
-    if exclude_lesson_id:
-        q_lessons["id"] = {"$ne": exclude_lesson_id}
-
-    lessons_same_day = await db.lessons.find(q_lessons, {"_id": 0}).to_list(1000)
-    for ex in lessons_same_day:
-        ex_start = _to_minutes(ex["start_time"])
-        ex_end = _to_minutes(ex["end_time"])
-        # overlap if (start < ex_end) and (end > ex_start)
-        if start_min < ex_end and end_min > ex_start:
-            return True
-
-    # Check other overrides on the SAME DATE
-    overrides_same_date = await db.lesson_overrides.find({
-        "teacher_id": teacher_id,
-        "new_date": target_date
-    }, {"_id": 0}).to_list(1000)
-
-    for ov in overrides_same_date:
-        if exclude_lesson_id and ov.get("lesson_id") == exclude_lesson_id:
-            # the same lesson may have the same override (ignore self)
-            continue
-        ov_start = _to_minutes(ov["new_start_time"])
-        ov_end = _to_minutes(ov["new_end_time"])
-        if start_min < ov_end and end_min > ov_start:
-            return True
+    lesson_conflict, override_conflict = await asyncio.gather(
+        _find_lesson_conflict(teacher_id, weekday, start_min, end_min, exclude_lesson_id),
+        _find_override_conflict(teacher_id, target_date, start_min, end_min, exclude_lesson_id)
+    )
+    return lesson_conflict is not None or override_conflict is not None
 
-    return False
+def _version_buckets(weekday: int, start_min: int, end_min: int) -> List[str]:
+    # "weekday.bucket" version keys an interval touches; two intervals can
+    # only overlap if they share at least one key
+    first = start_min // SCHEDULE_VERSION_BUCKET_MINUTES
+    last = max(start_min, end_min - 1) // SCHEDULE_VERSION_BUCKET_MINUTES
+    return [f"{weekday}.{bucket}" for bucket in range(first, last + 1)]
+
+class _ScheduleBooker:
+    """
+    Optimistic per-teacher booking. Each attempt reads the teacher's
+    schedule_versions document, runs the conflict check, writes, and then
+    advances the versions of every (weekday, time bucket) the booking
+    touches in one compare-and-set update. A concurrent booking that could
+    overlap shares a bucket and makes one of the two compare-and-sets miss;
+    the loser re-checks at the new versions and either commits or backs
+    off. Bookings of different teachers, days and hours never contend.
+    """
+    def __init__(self, max_attempts: int, retry_base_seconds: float):
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.committed = 0
+        self.conflicts = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    async def read_versions(self, teacher_id: str) -> dict:
+        versions = await db.schedule_versions.find_one({'_id': teacher_id}, {'version': 1, 'days': 1})
+        return versions or {}
+
+    @staticmethod
+    def seen_buckets(versions: dict, buckets: List[str]) -> dict:
+        days = versions.get('days') or {}
+        seen = {}
+        for key in buckets:
+            weekday, bucket = key.split('.')
+            seen[key] = (days.get(weekday) or {}).get(bucket, 0)
+        return seen
+
+    async def advance(self, teacher_id: str, seen: dict) -> bool:
+        query = {'_id': teacher_id}
+        inc = {'version': 1}
+        for key, version in seen.items():
+            query[f'days.{key}'] = version if version else {'$in': [0, None]}
+            inc[f'days.{key}'] = 1
+        try:
+            await db.schedule_versions.update_one(query, {'$inc': inc}, upsert=True)
+        except DuplicateKeyError:
+            # the filter missed the existing document, so the upsert collided with it
+            return False
+        return True
+
+    async def backoff(self, attempt: int) -> None:
+        self.retries += 1
+        await asyncio.sleep(random.uniform(0, self.retry_base_seconds * (2 ** min(attempt, 6))))
+
+    def exhausted_error(self) -> HTTPException:
+        self.exhausted += 1
+        return HTTPException(status_code=503, detail="Takvim şu anda yoğun, lütfen tekrar deneyin")
+
+    async def book(self, teacher_id: str, buckets: List[str], check, write, undo, finalize=None):
+        """
+        check() returns an HTTPException for a conflict (ignoring this
+        booking's own pending write) or None; write() applies the booking,
+        undo() reverts it and finalize() runs once it is committed. undo()
+        must be a no-op when write() did not get to apply anything, since it
+        also runs when write() itself fails. A pending write is visible to calendar and feed reads, so the
+        schedule version is bumped again after every undo and finalize;
+        nothing rendered in between stays cached under the final version.
+        """
+        pending = False
+        try:
+            for attempt in range(self.max_attempts):
+                versions = await self.read_versions(teacher_id)
+                conflict = await check()
+                if conflict is not None:
+                    if not pending:
+                        self.conflicts += 1
+                        raise conflict
+                    # a booking that committed (or is pending) in between overlaps ours
+                    await undo()
+                    pending = False
+                    await _schedule_changed(teacher_id)
+                    await self.backoff(attempt)
+                    continue
+                if not pending:
+                    pending = True  # set first: a write that fails halfway is undone too
+                    await write()
+                if await self.advance(teacher_id, self.seen_buckets(versions, buckets)):
+                    if finalize is not None:
+                        await finalize()
+                        pending = False
+                        await _schedule_changed(teacher_id)
+                    else:
+                        pending = False
+                        schedule_index.invalidate(teacher_id)
+                        availability_index.mark_stale(teacher_id)
+                    self.committed += 1
+                    return
+                await self.backoff(attempt)
+            raise self.exhausted_error()
+        except BaseException:
+            # Conflicts, exhaustion, DB errors and cancellation (client gone)
+            # alike: never leave an uncommitted write behind
+            if pending:
+                async def _release():
+                    await undo()
+                    await _schedule_changed(teacher_id)
+                await asyncio.shield(asyncio.ensure_future(_release()))
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "committed": self.committed,
+            "conflicts": self.conflicts,
+            "retries": self.retries,
+            "exhausted": self.exhausted
+        }
+
+schedule_booker = _ScheduleBooker(BOOKING_MAX_ATTEMPTS, BOOKING_RETRY_BASE_SECONDS)
+
+async def backfill_schedule_minutes(database) -> None:
+    """
+    Populate start_min/end_min on lessons and new_start_min/new_end_min on
+    overrides that predate those fields, server-side in one update per
+    collection.
+    """
+    def _minutes_expr(field: str) -> dict:
+        parts = {'$split': [f"${field}", ':']}
+        return {'$add': [
+            {'$multiply': [{'$toInt': {'$arrayElemAt': [parts, 0]}}, 60]},
+            {'$toInt': {'$arrayElemAt': [parts, 1]}}
+        ]}
+
+    await database.lessons.update_many(
+        {'start_min': {'$exists': False}},
+        [{'$set': {'start_min': _minutes_expr('start_time'), 'end_min': _minutes_expr('end_time')}}]
+    )
+    await database.lesson_overrides.update_many(
+        {'new_start_min': {'$exists': False}},
+        [{'$set': {'new_start_min': _minutes_expr('new_start_time'), 'new_end_min': _minutes_expr('new_end_time')}}]
+    )
+
+class _UserCache:
+    """
+    Bounded TTL/LRU cache of resolved User models keyed by user id.
+    Entries are dropped explicitly whenever the user document changes.
+    """
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (expires_at, User)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return user
+
+    def put(self, user_id: str, user) -> None:
+        if self.ttl_seconds <= 0 or self.max_size <= 0:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+user_cache = _UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_SIZE)
+
+class _LatencyStats:
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._recent = deque(maxlen=window)
+
+    def record(self, ms: float) -> None:
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self._recent.append(ms)
+
+    def snapshot(self) -> dict:
+        recent = sorted(self._recent)
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p95_ms": round(p95, 2),
+            "max_ms": round(self.max_ms, 2)
+        }
+
+class _BoundedExecutor:
+    """
+    Runs blocking calls on a dedicated pool with a concurrency cap.
+    When more than max_queue calls are already waiting for a slot the call
+    fails fast with 503 instead of piling up behind the pool.
+    """
+    def __init__(self, name: str, executor, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_stats = _LatencyStats()
+        self.run_stats = _LatencyStats()
+
+    async def run(self, fn, *args):
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Sunucu şu anda yoğun, lütfen tekrar deneyin")
+
+        self.queued += 1
+        enqueued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.perf_counter()
+        self.wait_stats.record((started_at - enqueued_at) * 1000)
+        self.running += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self.run_stats.record((time.perf_counter() - started_at) * 1000)
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait": self.wait_stats.snapshot(),
+            "run": self.run_stats.snapshot()
+        }
+
+password_executor = _BoundedExecutor(
+    "password-hash",
+    ThreadPoolExecutor(max_workers=PASSWORD_HASH_CONCURRENCY, thread_name_prefix="password-hash"),
+    PASSWORD_HASH_CONCURRENCY,
+    PASSWORD_HASH_MAX_QUEUE
+)
+
+class _KeyedLimiter:
+    """
+    Per-key concurrency cap (e.g. per teacher) in front of a shared pool, so
+    one busy key queues behind itself instead of filling the pool. Keys
+    only hold a semaphore while they have calls in flight.
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._entries = {}  # key -> [semaphore, calls in flight]
+        self.throttled = 0
+        self.wait_stats = _LatencyStats()
+
+    async def run(self, key: str, fn, *args):
+        entry = self._entries.setdefault(key, [asyncio.Semaphore(self.limit), 0])
+        entry[1] += 1
+        try:
+            if entry[0].locked():
+                self.throttled += 1
+            enqueued_at = time.perf_counter()
+            async with entry[0]:
+                self.wait_stats.record((time.perf_counter() - enqueued_at) * 1000)
+                return await fn(*args)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "limit_per_key": self.limit,
+            "active_keys": len(self._entries),
+            "throttled": self.throttled,
+            "wait": self.wait_stats.snapshot()
+        }
+
+report_pdf_executor = _BoundedExecutor(
+    "report-pdf",
+    ProcessPoolExecutor(max_workers=REPORT_RENDER_WORKERS, mp_context=multiprocessing.get_context('spawn')),
+    REPORT_RENDER_WORKERS,
+    REPORT_RENDER_MAX_QUEUE
+)
+report_render_limiter = _KeyedLimiter(REPORT_RENDER_PER_TEACHER)
 
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -397,6 +1089,55 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+async def hash_password_async(password: str) -> str:
+    return await password_executor.run(hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await password_executor.run(verify_password, password, hashed)
+
+async def _highest_taken_username_seq(base_username: str) -> int:
+    # base -> 1, base1 -> 2, base2 -> 3 ... (same numbering as the counter).
+    # Only suffixes of up to 18 digits count, so $toLong can never overflow;
+    # longer ones are far beyond anything the counter will reach.
+    pipeline = [
+        {'$match': {'username': {'$regex': f"^{re.escape(base_username)}[0-9]{{0,18}}$"}}},
+        {'$project': {'_id': 0, 'suffix': {'$substrCP': ['$username', len(base_username), 32]}}},
+        {'$group': {'_id': None, 'seq': {'$max': {'$cond': [
+            {'$eq': ['$suffix', '']}, 1,
+            {'$add': [{'$toLong': '$suffix'}, 1]}
+        ]}}}}
+    ]
+    result = await db.users.aggregate(pipeline).to_list(1)
+    return int(result[0]['seq']) if result else 0
+
+async def _seed_username_counter(base_username: str) -> None:
+    # Move the counter past usernames created before it existed (or by hand)
+    taken = await _highest_taken_username_seq(base_username)
+    try:
+        await db.username_counters.update_one({'_id': base_username}, {'$max': {'seq': taken}}, upsert=True)
+    except DuplicateKeyError:
+        # a concurrent seed created the document first
+        await db.username_counters.update_one({'_id': base_username}, {'$max': {'seq': taken}})
+
+async def _allocate_username(base_username: str, reseed: bool = False) -> str:
+    """
+    Hand out base, base1, base2 ... from an atomic per-base counter so
+    registration costs one round trip however many collisions exist.
+    A base's counter is seeded past existing usernames before its first
+    increment, so concurrent first registrations of a base never start
+    below them; reseed=True re-runs the seed after a collision.
+    """
+    if reseed or not await db.username_counters.find_one({'_id': base_username}, {'_id': 1}):
+        await _seed_username_counter(base_username)
+    counter = await db.username_counters.find_one_and_update(
+        {'_id': base_username},
+        {'$inc': {'seq': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    seq = counter['seq']
+    return base_username if seq == 1 else f"{base_username}{seq - 1}"
+
 def create_access_token(user_id: str, email: str) -> str:
     payload = {
         'user_id': user_id,
@@ -413,16 +1154,319 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         if not user_id:
             raise HTTPException(status_code=401, detail="Geçersiz token")
         
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
         user = await db.users.find_one({'id': user_id}, {'_id': 0})
         if not user:
             raise HTTPException(status_code=401, detail="Kullanıcı bulunamadı")
         
-        return User(**user)
+        current_user = User(**user)
+        user_cache.put(user_id, current_user)
+        return current_user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token süresi dolmuş")
     except Exception as e:
         raise HTTPException(status_code=401, detail="Geçersiz token")
 
+# ============ EMAIL OUTBOX ============
+
+# Outbox priorities: the worker claims lower values first
+EMAIL_PRIORITY_TRANSACTIONAL = 0
+EMAIL_PRIORITY_BULK = 1
+
+def _outbox_doc(subject: str, recipients: List[str], body: str, subtype: str = "plain",
+                priority: int = EMAIL_PRIORITY_TRANSACTIONAL, **extra) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        'id': str(uuid.uuid4()),
+        'subject': subject,
+        'recipients': recipients,
+        'body': body,
+        'subtype': subtype,
+        'status': 'pending',  # pending, sending, sent, dead
+        'priority': priority,
+        'attempts': 0,
+        'next_attempt_at': now,
+        'last_error': None,
+        'created_at': now,
+        **extra
+    }
+
+async def enqueue_email(subject: str, recipients: List[str], body: str, subtype: str = "plain", **extra) -> str:
+    outbox_doc = _outbox_doc(subject, recipients, body, subtype, **extra)
+    await db.email_outbox.insert_one(outbox_doc)
+    email_outbox_worker.wake()
+    return outbox_doc['id']
+
+async def enqueue_emails(outbox_docs: List[dict]) -> None:
+    # Many _outbox_doc()s in one round trip
+    await db.email_outbox.insert_many(outbox_docs)
+    email_outbox_worker.wake()
+
+class EmailOutboxWorker:
+    """
+    Drains email_outbox over one reused SMTP connection. Each message is
+    claimed atomically, so several API workers can run a drainer side by side.
+    Failed sends are retried with exponential backoff and end up in the
+    'dead' state after max_attempts. Transactional mail (password resets,
+    single reports) is claimed before bulk mail, and only bulk sends are
+    spaced to at most rate_per_second, so a large batch neither trips
+    provider limits nor holds up other mail. The connection and the rate
+    budget belong to this worker, i.e. to one process. Finished entries get
+    an expires_at for the TTL index; sent ones drop their body right away,
+    since it may hold live links such as password resets.
+    """
+    def __init__(self, database, hostname: str, port: int, sender: str,
+                 username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = False, start_tls: bool = False,
+                 batch_size: int = 20, max_attempts: int = 6,
+                 retry_base_seconds: float = 30, poll_seconds: float = 5,
+                 rate_per_second: float = 0, retention_days: float = 30,
+                 timeout: float = 60):
+        self.database = database
+        self.hostname = hostname
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.start_tls = start_tls
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.poll_seconds = poll_seconds
+        self.min_interval = 1 / rate_per_second if rate_per_second > 0 else 0
+        self.retention = timedelta(days=retention_days)
+        self.timeout = timeout
+        self._smtp = None
+        self._next_send_at = 0.0
+        self._work = asyncio.Event()
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.connections = 0
+        self.last_error = None
+
+    @classmethod
+    def from_config(cls, database, config: ConnectionConfig, **kwargs):
+        return cls(
+            database,
+            hostname=config.MAIL_SERVER,
+            port=config.MAIL_PORT,
+            sender=config.MAIL_FROM,
+            username=config.MAIL_USERNAME if config.USE_CREDENTIALS else None,
+            password=config.MAIL_PASSWORD.get_secret_value() if config.USE_CREDENTIALS else None,
+            use_tls=config.MAIL_SSL_TLS,
+            start_tls=config.MAIL_STARTTLS,
+            timeout=config.TIMEOUT,
+            **kwargs
+        )
+
+    async def _connection(self):
+        if self._smtp is not None and self._smtp.is_connected:
+            return self._smtp
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            timeout=self.timeout
+        )
+        await smtp.connect()
+        if self.username:
+            await smtp.login(self.username, self.password)
+        self._smtp = smtp
+        self.connections += 1
+        return smtp
+
+    async def close(self) -> None:
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.quit()
+            except Exception:
+                self._smtp.close()
+        self._smtp = None
+
+    async def _recover(self, error: Exception) -> None:
+        # A rejected message leaves the session usable; anything else drops it
+        if isinstance(error, aiosmtplib.SMTPResponseException) and self._smtp is not None:
+            try:
+                await self._smtp.rset()
+                return
+            except Exception:
+                pass
+        await self.close()
+
+    def _build_message(self, item: dict) -> EmailMessage:
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = ', '.join(item['recipients'])
+        message['Subject'] = item['subject']
+        message.set_content(item['body'], subtype=item.get('subtype', 'plain'))
+        return message
+
+    async def _throttle(self) -> None:
+        if not self.min_interval:
+            return
+        now = time.monotonic()
+        if self._next_send_at > now:
+            await asyncio.sleep(self._next_send_at - now)
+            now = self._next_send_at
+        self._next_send_at = now + self.min_interval
+
+    def wake(self) -> None:
+        # New mail was queued: skip the rest of the idle poll interval
+        self._work.set()
+
+    async def _idle(self) -> None:
+        try:
+            await asyncio.wait_for(self._work.wait(), timeout=self.poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._work.clear()
+
+    async def _send(self, message: EmailMessage) -> None:
+        try:
+            smtp = await self._connection()
+            await smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # The reused connection went stale between batches; reconnect once
+            self._smtp = None
+            smtp = await self._connection()
+            await smtp.send_message(message)
+
+    async def _claim_batch(self) -> List[dict]:
+        now = datetime.now(timezone.utc).isoformat()
+        batch = []
+        for _ in range(self.batch_size):
+            item = await self.database.email_outbox.find_one_and_update(
+                {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+                {'$set': {'status': 'sending', 'claimed_at': now}},
+                sort=[('priority', 1), ('next_attempt_at', 1)],
+                projection={'_id': 0},
+                return_document=ReturnDocument.AFTER
+            )
+            if not item:
+                break
+            batch.append(item)
+        return batch
+
+    async def _mark_failed(self, item: dict, error: Exception) -> None:
+        attempts = item.get('attempts', 0) + 1
+        self.last_error = str(error)
+        update = {'attempts': attempts, 'last_error': str(error)}
+        if attempts >= self.max_attempts:
+            update['status'] = 'dead'
+            update['expires_at'] = datetime.now(timezone.utc) + self.retention
+            self.dead += 1
+            logger.error(f"Email gönderilemedi, dead-letter'a taşındı ({item['id']}): {error}")
+        else:
+            delay = self.retry_base_seconds * (2 ** (attempts - 1))
+            update['status'] = 'pending'
+            update['next_attempt_at'] = (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat()
+            self.retried += 1
+            logger.warning(f"Email gönderme hatası, {delay:.0f} sn sonra tekrar denenecek ({item['id']}): {error}")
+        await self.database.email_outbox.update_one({'id': item['id']}, {'$set': update})
+
+    async def requeue_stale(self, older_than_seconds: float = 600) -> None:
+        # Messages left in 'sending' by a worker that died mid-batch
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=older_than_seconds)).isoformat()
+        await self.database.email_outbox.update_many(
+            {'status': 'sending', 'claimed_at': {'$lt': cutoff}},
+            {'$set': {'status': 'pending'}}
+        )
+
+    async def expire_finished(self) -> None:
+        # Entries finished before expires_at existed
+        expires_at = datetime.now(timezone.utc) + self.retention
+        await self.database.email_outbox.update_many(
+            {'status': 'sent', 'expires_at': {'$exists': False}},
+            {'$set': {'expires_at': expires_at}, '$unset': {'body': ''}}
+        )
+        await self.database.email_outbox.update_many(
+            {'status': 'dead', 'expires_at': {'$exists': False}},
+            {'$set': {'expires_at': expires_at}}
+        )
+
+    async def _release(self, items: List[dict]) -> None:
+        # Claimed entries this worker will not get to; only those still 'sending'
+        if items:
+            await self.database.email_outbox.update_many(
+                {'id': {'$in': [item['id'] for item in items]}, 'status': 'sending'},
+                {'$set': {'status': 'pending'}}
+            )
+
+    async def drain_once(self) -> int:
+        batch = await self._claim_batch()
+        done = 0
+        try:
+            for item in batch:
+                if item.get('priority', EMAIL_PRIORITY_TRANSACTIONAL) >= EMAIL_PRIORITY_BULK:
+                    await self._throttle()
+                try:
+                    await self._send(self._build_message(item))
+                except Exception as e:
+                    await self._mark_failed(item, e)
+                    await self._recover(e)
+                    done += 1
+                    continue
+                self.sent += 1
+                now = datetime.now(timezone.utc)
+                await self.database.email_outbox.update_one(
+                    {'id': item['id']},
+                    {'$set': {
+                        'status': 'sent',
+                        'attempts': item.get('attempts', 0) + 1,
+                        'sent_at': now.isoformat(),
+                        'expires_at': now + self.retention
+                    }, '$unset': {'body': ''}}
+                )
+                done += 1
+        except BaseException:
+            # A failed status write or cancellation must not strand the rest
+            # of the batch in 'sending' until the stale sweep
+            await asyncio.shield(asyncio.ensure_future(self._release(batch[done:])))
+            raise
+        return len(batch)
+
+    async def run(self) -> None:
+        await self.requeue_stale()
+        await self.expire_finished()
+        while True:
+            try:
+                if await self.drain_once() == 0:
+                    await self.close()
+                    await self.requeue_stale()  # batches of workers that died since startup
+                    await self._idle()
+            except asyncio.CancelledError:
+                await self.close()
+                raise
+            except Exception as e:
+                logger.error(f"Email outbox worker error: {e}")
+                await asyncio.sleep(self.poll_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead": self.dead,
+            "connections": self.connections,
+            "last_error": self.last_error
+        }
+
+email_outbox_worker = EmailOutboxWorker.from_config(
+    db,
+    conf,
+    batch_size=EMAIL_OUTBOX_BATCH_SIZE,
+    max_attempts=EMAIL_OUTBOX_MAX_ATTEMPTS,
+    retry_base_seconds=EMAIL_OUTBOX_RETRY_BASE_SECONDS,
+    poll_seconds=EMAIL_OUTBOX_POLL_SECONDS,
+    rate_per_second=EMAIL_OUTBOX_RATE_PER_SECOND,
+    retention_days=EMAIL_OUTBOX_RETENTION_DAYS
+)
+
 # ============ AUTH ROUTES ============
 
 @api_router.post("/auth/register")
@@ -432,25 +1476,29 @@ async def register(user_data: UserRegister):
     if existing:
         raise HTTPException(status_code=400, detail="Bu email zaten kullanılıyor")
     
-    # Generate username from name
-    base_username = user_data.full_name.lower().replace(' ', '_')
-    username = base_username
-    counter = 1
-    while await db.users.find_one({'username': username}):
-        username = f"{base_username}{counter}"
-        counter += 1
-    
     # Create user
     user_dict = user_data.model_dump()
-    user_dict['password'] = hash_password(user_data.password)
+    user_dict['password'] = await hash_password_async(user_data.password)
     user_dict['id'] = str(uuid.uuid4())
-    user_dict['username'] = username
     user_dict['bio'] = None
     user_dict['role'] = 'teacher'
     user_dict['created_at'] = datetime.now(timezone.utc).isoformat()
     user_dict['avatar'] = None
     
-    await db.users.insert_one(user_dict)
+    # Generate username from name; the unique index on users.username is the
+    # final guard, a collision re-seeds the counter and takes the next suffix
+    base_username = user_data.full_name.lower().replace(' ', '_')
+    for attempt in range(USERNAME_ALLOCATION_ATTEMPTS):
+        user_dict['username'] = await _allocate_username(base_username, reseed=attempt > 0)
+        try:
+            await db.users.insert_one(user_dict)
+            break
+        except DuplicateKeyError as e:
+            user_dict.pop('_id', None)
+            if 'username' not in (e.details or {}).get('keyPattern', {}):
+                raise HTTPException(status_code=400, detail="Bu email zaten kullanılıyor")
+    else:
+        raise HTTPException(status_code=503, detail="Kullanıcı adı oluşturulamadı, lütfen tekrar deneyin")
     
     # Create token
     token = create_access_token(user_dict['id'], user_dict['email'])
@@ -463,7 +1511,7 @@ async def register(user_data: UserRegister):
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
     user = await db.users.find_one({'email': credentials.email})
-    if not user or not verify_password(credentials.password, user['password']):
+    if not user or not await verify_password_async(credentials.password, user['password']):
         raise HTTPException(status_code=401, detail="Email veya şifre hatalı")
     
     token = create_access_token(user['id'], user['email'])
@@ -486,7 +1534,7 @@ async def forgot_password(request: ForgotPasswordRequest):
     # Send email
     reset_link = f"http://localhost:3000/reset-password/{token}"
     
-    message = MessageSchema(
+    await enqueue_email(
         subject="Mentra - Şifre Sıfırlama",
         recipients=[request.email],
         body=f"""
@@ -505,11 +1553,6 @@ async def forgot_password(request: ForgotPasswordRequest):
         subtype="plain"
     )
     
-    try:
-        await fastmail.send_message(message)
-    except Exception as e:
-        logger.error(f"Email gönderme hatası: {e}")
-    
     return {"message": "Şifre sıfırlama bağlantısı email adresinize gönderildi"}
 
 @api_router.post("/auth/reset-password")
@@ -524,11 +1567,12 @@ async def reset_password(request: ResetPasswordRequest):
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
     
     # Update password
-    new_password_hash = hash_password(request.new_password)
+    new_password_hash = await hash_password_async(request.new_password)
     await db.users.update_one(
         {'email': email},
         {'$set': {'password': new_password_hash}}
     )
+    user_cache.invalidate(user['id'])
     
     return {"message": "Şifreniz başarıyla güncellendi"}
 
@@ -539,15 +1583,16 @@ async def get_me(current_user: User = Depends(get_current_user)):
 @api_router.post("/auth/change-password")
 async def change_password(request: ChangePasswordRequest, current_user: User = Depends(get_current_user)):
     user = await db.users.find_one({'id': current_user.id})
-    if not user or not verify_password(request.current_password, user['password']):
+    if not user or not await verify_password_async(request.current_password, user['password']):
         raise HTTPException(status_code=401, detail="Mevcut şifre hatalı")
     
     # Update password
-    new_password_hash = hash_password(request.new_password)
+    new_password_hash = await hash_password_async(request.new_password)
     await db.users.update_one(
         {'id': current_user.id},
         {'$set': {'password': new_password_hash}}
     )
+    user_cache.invalidate(current_user.id)
     
     return {"message": "Şifreniz başarıyla değiştirildi"}
 
@@ -621,48 +1666,66 @@ async def google_callback(code: str):
 
 @api_router.get("/teacher/dashboard", response_model=DashboardStats)
 async def get_dashboard(current_user: User = Depends(get_current_user)):
-    # Counts
-    students_count = await db.students.count_documents({'teacher_id': current_user.id})
-    weekly_lessons = await db.lessons.count_documents({
-        'teacher_id': current_user.id,
-        'status': {'$in': ['scheduled', 'completed']}
-    })
-
-    # Pending payments
-    pending_payments_cursor = db.payments.find({
-        'teacher_id': current_user.id,
-        'status': 'Beklemede'
-    })
-    pending_payments = sum([p['amount'] async for p in pending_payments_cursor])
-
     # Today context
     today_dt = datetime.now(timezone.utc)
     today_str = today_dt.strftime('%Y-%m-%d')
     weekday = today_dt.weekday()  # 0=Mon .. 6=Sun
     week_key = _iso_week_key(today_str)
 
-    # Fetch overrides for THIS week
-    overrides_this_week = await db.lesson_overrides.find({
-        "teacher_id": current_user.id,
-        "week_key": week_key
-    }, {"_id": 0}).to_list(1000)
+    # Counts, pending payments, this week's overrides and today's regular
+    # lessons are independent of each other -> one concurrent round trip
+    students_count, weekly_lessons, pending_payments, overrides_this_week, base_lessons = await asyncio.gather(
+        db.students.count_documents({'teacher_id': current_user.id}),
+        db.lessons.count_documents({
+            'teacher_id': current_user.id,
+            'status': {'$in': ['scheduled', 'completed']}
+        }),
+        payment_totals(current_user.id, statuses=['Beklemede']),
+        db.lesson_overrides.find({
+            "teacher_id": current_user.id,
+            "week_key": week_key
+        }, {"_id": 0}).to_list(1000),
+        db.lessons.find({
+            'teacher_id': current_user.id,
+            'day_of_week': weekday,
+            'status': {'$in': ['scheduled', 'completed']}
+        }, {'_id': 0}).to_list(None)
+    )
+
+    pending_payments = pending_payments.get('Beklemede', 0)
 
     # Build sets for filtering
     moved_from_today_ids = set([ov["lesson_id"] for ov in overrides_this_week if ov.get("original_date") == today_str])
     moved_to_today = [ov for ov in overrides_this_week if ov.get("new_date") == today_str]
 
+    # Original lessons of overrides moved TO today, in one $in lookup
+    lessons_by_id = {lesson['id']: lesson for lesson in base_lessons}
+    missing_lesson_ids = list({ov['lesson_id'] for ov in moved_to_today} - set(lessons_by_id))
+    if missing_lesson_ids:
+        moved_lessons = await db.lessons.find({
+            'id': {'$in': missing_lesson_ids},
+            'teacher_id': current_user.id
+        }, {'_id': 0}).to_list(None)
+        lessons_by_id.update({lesson['id']: lesson for lesson in moved_lessons})
+
+    # Students of every lesson shown today, in one $in lookup
+    student_ids = {lesson['student_id'] for lesson in base_lessons}
+    student_ids.update(lessons_by_id[ov['lesson_id']]['student_id']
+                       for ov in moved_to_today if ov['lesson_id'] in lessons_by_id)
+    students_by_id = {
+        student['id']: student
+        for student in await db.students.find(
+            {'id': {'$in': list(student_ids)}}, {'_id': 0, 'id': 1, 'full_name': 1}
+        ).to_list(None)
+    } if student_ids else {}
+
     # Base today's lessons (regular schedule)
-    base_today_cursor = db.lessons.find({
-        'teacher_id': current_user.id,
-        'day_of_week': weekday,
-        'status': {'$in': ['scheduled', 'completed']}
-    }, {'_id': 0})
     base_today_lessons = []
-    async for lesson in base_today_cursor:
+    for lesson in base_lessons:
         if lesson['id'] in moved_from_today_ids:
             # This lesson was rescheduled away from today -> skip
             continue
-        student = await db.students.find_one({'id': lesson['student_id']}, {'_id': 0})
+        student = students_by_id.get(lesson['student_id'])
         if student:
             base_today_lessons.append({
                 'lesson_id': lesson['id'],
@@ -676,11 +1739,10 @@ async def get_dashboard(current_user: User = Depends(get_current_user)):
 
     # Add lessons moved TO today via overrides
     for ov in moved_to_today:
-        # Get original lesson to fetch student/topic
-        lesson = await db.lessons.find_one({'id': ov['lesson_id']}, {'_id': 0})
+        lesson = lessons_by_id.get(ov['lesson_id'])
         if not lesson:
             continue
-        student = await db.students.find_one({'id': lesson['student_id']}, {'_id': 0})
+        student = students_by_id.get(lesson['student_id'])
         if not student:
             continue
         base_today_lessons.append({
@@ -722,6 +1784,9 @@ async def update_profile(full_name: Optional[str] = None, age: Optional[int] = N
             {'id': current_user.id},
             {'$set': update_data}
         )
+        user_cache.invalidate(current_user.id)
+        if 'full_name' in update_data and full_name != current_user.full_name:
+            await _schedule_changed(current_user.id)  # the calendar feed is named after the teacher
     
     updated_user = await db.users.find_one({'id': current_user.id}, {'_id': 0})
     return User(**{k: v for k, v in updated_user.items() if k != 'password'})
@@ -743,6 +1808,7 @@ async def upload_avatar(file: UploadFile = File(...), current_user: User = Depen
         {'id': current_user.id},
         {'$set': {'avatar': avatar_url}}
     )
+    user_cache.invalidate(current_user.id)
     
     return {"avatar": avatar_url}
 
@@ -759,8 +1825,9 @@ async def create_student(student_data: StudentCreate, current_user: User = Depen
     return Student(**student_dict)
 
 @api_router.get("/students", response_model=List[Student])
-async def get_students(current_user: User = Depends(get_current_user)):
-    students = await db.students.find({'teacher_id': current_user.id}, {'_id': 0}).to_list(1000)
+async def get_students(response: Response, limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+                       cursor: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    students = await _paginate(db.students, {'teacher_id': current_user.id}, response, limit, cursor)
     return [Student(**s) for s in students]
 
 @api_router.get("/students/{student_id}", response_model=Student)
@@ -774,11 +1841,12 @@ async def get_student(student_id: str, current_user: User = Depends(get_current_
 async def update_student(student_id: str, student_data: StudentCreate, current_user: User = Depends(get_current_user)):
     result = await db.students.update_one(
         {'id': student_id, 'teacher_id': current_user.id},
-        {'$set': student_data.model_dump()}
+        {'$set': student_data.model_dump(), '$inc': {'data_version': 1}}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Öğrenci bulunamadı")
+    await _schedule_changed(current_user.id)  # student names appear in the calendar
     
     updated_student = await db.students.find_one({'id': student_id}, {'_id': 0})
     return Student(**updated_student)
@@ -793,6 +1861,7 @@ async def delete_student(student_id: str, current_user: User = Depends(get_curre
     
     # Cascade delete related data
     await db.lessons.delete_many({'student_id': student_id, 'teacher_id': current_user.id})
+    await _schedule_changed(current_user.id)
     await db.sessions.delete_many({'student_id': student_id, 'teacher_id': current_user.id})
     await db.payments.delete_many({'student_id': student_id, 'teacher_id': current_user.id})
     
@@ -815,106 +1884,340 @@ async def get_iso_week_days(original_date: str):
 
 @api_router.post("/lessons", response_model=Lesson)
 async def create_lesson(lesson_data: LessonCreate, current_user: User = Depends(get_current_user)):
-    # Check for time conflicts
-    start_time = lesson_data.start_time
-    end_time = lesson_data.end_time
     day_of_week = lesson_data.day_of_week
     
-    # Parse times
-    start_h, start_m = map(int, start_time.split(':'))
-    end_h, end_m = map(int, end_time.split(':'))
-    start_minutes = start_h * 60 + start_m
-    end_minutes = end_h * 60 + end_m
+    lesson_dict = _with_minutes(lesson_data.model_dump())
+    lesson_dict['id'] = str(uuid.uuid4())
+    lesson_dict['teacher_id'] = current_user.id
+    lesson_dict['created_at'] = datetime.now(timezone.utc).isoformat()
     
-    # Check existing lessons for this teacher on the same day
-    existing_lessons = await db.lessons.find({
-        'teacher_id': current_user.id,
-        'day_of_week': day_of_week
-    }, {'_id': 0}).to_list(1000)
-    
-    for existing in existing_lessons:
-        ex_start_h, ex_start_m = map(int, existing['start_time'].split(':'))
-        ex_end_h, ex_end_m = map(int, existing['end_time'].split(':'))
-        ex_start_minutes = ex_start_h * 60 + ex_start_m
-        ex_end_minutes = ex_end_h * 60 + ex_end_m
-        
-        # Check if times overlap
-        if (start_minutes < ex_end_minutes and end_minutes > ex_start_minutes):
-            raise HTTPException(
+    async def check():
+        # Check existing lessons for this teacher on the same day
+        existing = await _find_lesson_conflict(
+            current_user.id, day_of_week, lesson_dict['start_min'], lesson_dict['end_min'], lesson_dict['id']
+        )
+        if existing:
+            return HTTPException(
                 status_code=400, 
                 detail=f"Bu saatte zaten bir dersiniz var ({existing['start_time']}-{existing['end_time']}). Lütfen farklı bir saat seçin."
             )
+        return None
     
-    lesson_dict = lesson_data.model_dump()
-    lesson_dict['id'] = str(uuid.uuid4())
-    lesson_dict['teacher_id'] = current_user.id
-    lesson_dict['created_at'] = datetime.now(timezone.utc).isoformat()
+    async def write():
+        await db.lessons.insert_one(dict(lesson_dict))
     
-    await db.lessons.insert_one(lesson_dict)
+    async def undo():
+        await db.lessons.delete_one({'id': lesson_dict['id']})
+    
+    await schedule_booker.book(
+        current_user.id, _version_buckets(day_of_week, lesson_dict['start_min'], lesson_dict['end_min']),
+        check, write, undo
+    )
+    await _student_data_changed(lesson_dict['student_id'])
     return Lesson(**lesson_dict)
 
+@api_router.get("/lessons/free-slots")
+async def get_free_slots(week: Optional[str] = None, duration: int = Query(60, ge=5, le=720),
+                         day_start: str = "08:00", day_end: str = "22:00",
+                         exclude_lesson_id: Optional[str] = None,
+                         current_user: User = Depends(get_current_user)):
+    """
+    Every free gap of at least `duration` minutes in the teacher's ISO week
+    (YYYY-Www, defaults to the current week), between day_start and day_end.
+    Busy time is the same set the reschedule conflict check uses: weekly
+    lessons plus overrides moved onto each date. Pass exclude_lesson_id when
+    looking for a new slot for that lesson.
+    """
+    if week is None:
+        week = _iso_week_key(datetime.now(timezone.utc).strftime('%Y-%m-%d'))
+    try:
+        monday = datetime.strptime(f"{week}-1", "%G-W%V-%u").date()
+        window_start, window_end = _to_minutes(day_start), _to_minutes(day_end)
+        for hhmm in (day_start, day_end):
+            hour, minute = map(int, hhmm.split(":"))
+            if not (0 <= hour <= 23 and 0 <= minute <= 59):
+                raise ValueError(hhmm)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz hafta veya saat formatı")
+    
+    dates = [(monday + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
+    schedule = await schedule_index.get(current_user.id)
+    overrides_by_date = await schedule_index.overrides_between(current_user.id, dates)
+    
+    days = []
+    for weekday, date_str in enumerate(dates):
+        busy = heapq.merge(schedule.lessons_on(weekday).items, overrides_by_date[date_str].items)
+        free = []
+        cursor = window_start
+        for start_min, end_min, key, _, _ in busy:
+            if key == exclude_lesson_id:
+                continue
+            if start_min - cursor >= duration and cursor < window_end:
+                free.append((cursor, min(start_min, window_end)))
+            cursor = max(cursor, end_min)
+        if window_end - cursor >= duration:
+            free.append((cursor, window_end))
+        days.append({
+            "date": date_str,
+            "day_of_week": weekday,
+            "free": [{"start_time": _to_hhmm(a), "end_time": _to_hhmm(b)}
+                     for a, b in free if b - a >= duration]
+        })
+    
+    return {"week_key": _iso_week_key(dates[0]), "duration": duration, "days": days}
+
+@api_router.post("/lessons/bulk")
+async def create_lessons_bulk(payload: LessonBulkCreate, current_user: User = Depends(get_current_user)):
+    # One read (the teacher's interval index, free when warm) and one insert_many.
+    # Each slot is checked against existing lessons and against the slots
+    # accepted before it; conflicting slots are reported, the rest inserted.
+    requested = []
+    invalid = {}
+    for index, lesson_data in enumerate(payload.lessons):
+        try:
+            start_min, end_min = _to_minutes(lesson_data.start_time), _to_minutes(lesson_data.end_time)
+        except ValueError:
+            start_min = end_min = -1
+        if not 0 <= lesson_data.day_of_week <= 6 or start_min < 0 or end_min <= start_min:
+            invalid[index] = {"index": index, "status": "invalid", "detail": "Geçersiz gün veya saat"}
+            continue
+        requested.append((lesson_data.day_of_week, start_min, end_min, index, lesson_data))
+    
+    # Sorted by (day, start): a slot overlaps an earlier accepted slot of the
+    # same day exactly when the furthest accepted end passes its start
+    requested.sort(key=lambda item: item[:3])
+    
+    # Same optimistic protocol as single bookings: the whole batch commits
+    # with one compare-and-set over every bucket it touches, or is removed
+    # and re-planned against the newer schedule
+    for attempt in range(schedule_booker.max_attempts):
+        versions = await schedule_booker.read_versions(current_user.id)
+        schedule = await schedule_index.get(current_user.id, versions.get('version', 0))
+        results = [invalid.get(index) for index in range(len(payload.lessons))]
+        accepted_reach = {}  # day -> (max end, index of that slot)
+        now = datetime.now(timezone.utc).isoformat()
+        lesson_docs = []
+        buckets = []
+        for day, start_min, end_min, index, lesson_data in requested:
+            existing = schedule.lessons_on(day).find_overlap(start_min, end_min)
+            if existing:
+                results[index] = {
+                    "index": index,
+                    "status": "conflict",
+                    "conflict_with": {"lesson_id": existing[2], "start_time": existing[3], "end_time": existing[4]}
+                }
+                continue
+            reach = accepted_reach.get(day)
+            if reach and reach[0] > start_min:
+                results[index] = {"index": index, "status": "conflict", "conflict_with": {"index": reach[1]}}
+                continue
+            if not reach or end_min > reach[0]:
+                accepted_reach[day] = (end_min, index)
+            
+            lesson_dict = _with_minutes(lesson_data.model_dump())
+            lesson_dict['id'] = str(uuid.uuid4())
+            lesson_dict['teacher_id'] = current_user.id
+            lesson_dict['created_at'] = now
+            lesson_docs.append(lesson_dict)
+            buckets.extend(_version_buckets(day, start_min, end_min))
+            results[index] = {"index": index, "status": "created", "lesson_id": lesson_dict['id']}
+        
+        if not lesson_docs:
+            break
+        await db.lessons.insert_many([dict(doc) for doc in lesson_docs], ordered=False)
+        if await schedule_booker.advance(current_user.id, schedule_booker.seen_buckets(versions, sorted(set(buckets)))):
+            schedule_index.invalidate(current_user.id)
+            availability_index.mark_stale(current_user.id)
+            schedule_booker.committed += 1
+            break
+        await db.lessons.delete_many({'id': {'$in': [doc['id'] for doc in lesson_docs]}})
+        await _schedule_changed(current_user.id)
+        await schedule_booker.backoff(attempt)
+    else:
+        raise schedule_booker.exhausted_error()
+    await _student_data_changed(*[doc['student_id'] for doc in lesson_docs])
+    
+    return {
+        "created": [Lesson(**doc) for doc in lesson_docs],
+        "results": results
+    }
+
 @api_router.get("/lessons", response_model=List[Lesson])
-async def get_lessons(student_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
+async def get_lessons(response: Response, student_id: Optional[str] = None,
+                      limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX), cursor: Optional[str] = None,
+                      current_user: User = Depends(get_current_user)):
     query = {'teacher_id': current_user.id}
     if student_id:
         query['student_id'] = student_id
     
-    lessons = await db.lessons.find(query, {'_id': 0}).to_list(1000)
+    lessons = await _paginate(db.lessons, query, response, limit, cursor)
     return [Lesson(**l) for l in lessons]
 
 @api_router.put("/lessons/{lesson_id}", response_model=Lesson)
 async def update_lesson(lesson_id: str, lesson_data: LessonCreate, current_user: User = Depends(get_current_user)):
-    # Check for time conflicts (excluding current lesson)
-    start_time = lesson_data.start_time
-    end_time = lesson_data.end_time
     day_of_week = lesson_data.day_of_week
     
-    # Parse times
-    start_h, start_m = map(int, start_time.split(':'))
-    end_h, end_m = map(int, end_time.split(':'))
-    start_minutes = start_h * 60 + start_m
-    end_minutes = end_h * 60 + end_m
+    lesson_fields = _with_minutes(lesson_data.model_dump())
+    start_min, end_min = lesson_fields['start_min'], lesson_fields['end_min']
     
-    # Check existing lessons for this teacher on the same day (excluding current lesson)
-    existing_lessons = await db.lessons.find({
-        'teacher_id': current_user.id,
-        'day_of_week': day_of_week,
-        'id': {'$ne': lesson_id}
-    }, {'_id': 0}).to_list(1000)
-    
-    for existing in existing_lessons:
-        ex_start_h, ex_start_m = map(int, existing['start_time'].split(':'))
-        ex_end_h, ex_end_m = map(int, existing['end_time'].split(':'))
-        ex_start_minutes = ex_start_h * 60 + ex_start_m
-        ex_end_minutes = ex_end_h * 60 + ex_end_m
-        
-        # Check if times overlap
-        if (start_minutes < ex_end_minutes and end_minutes > ex_start_minutes):
-            raise HTTPException(
+    async def check():
+        # Check existing lessons for this teacher on the same day (excluding current lesson)
+        existing = await _find_lesson_conflict(current_user.id, day_of_week, start_min, end_min, lesson_id)
+        if existing:
+            return HTTPException(
                 status_code=400, 
                 detail=f"Bu saatte zaten bir dersiniz var ({existing['start_time']}-{existing['end_time']}). Lütfen farklı bir saat seçin."
             )
+        return None
+    
+    # The lesson keeps its current slot and holds the new one until the
+    # booking commits, so an undo never re-occupies a slot someone else took.
+    # One live hold per lesson: a concurrent edit must not replace (and then
+    # release) the hold of the edit in flight, but an abandoned hold older
+    # than BOOKING_HOLD_TTL_SECONDS is taken over.
+    hold_id = str(uuid.uuid4())
+    
+    async def write():
+        result = await db.lessons.update_one(
+            {'id': lesson_id, 'teacher_id': current_user.id, 'hold.held_at': {'$not': {'$gte': _hold_cutoff()}}},
+            {'$set': {'hold': {
+                'id': hold_id, 'day_of_week': day_of_week, 'start_min': start_min, 'end_min': end_min,
+                'held_at': datetime.now(timezone.utc).isoformat()
+            }}}
+        )
+        if result.matched_count == 0:
+            if await db.lessons.count_documents({'id': lesson_id, 'teacher_id': current_user.id}, limit=1):
+                raise HTTPException(status_code=409, detail="Bu ders şu anda başka bir işlemle güncelleniyor, lütfen tekrar deneyin")
+            raise HTTPException(status_code=404, detail="Ders bulunamadı")
     
-    result = await db.lessons.update_one(
-        {'id': lesson_id, 'teacher_id': current_user.id},
-        {'$set': lesson_data.model_dump()}
-    )
+    async def undo():
+        await db.lessons.update_one({'id': lesson_id, 'hold.id': hold_id}, {'$unset': {'hold': ''}})
     
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Ders bulunamadı")
+    previous = {}
+    
+    async def finalize():
+        previous.update(await db.lessons.find_one_and_update(
+            {'id': lesson_id}, {'$set': lesson_fields, '$unset': {'hold': ''}}, projection={'_id': 0, 'student_id': 1}
+        ) or {})
+    
+    await schedule_booker.book(
+        current_user.id, _version_buckets(day_of_week, start_min, end_min), check, write, undo, finalize
+    )
+    await _student_data_changed(previous.get('student_id'), lesson_fields['student_id'])
     
     updated_lesson = await db.lessons.find_one({'id': lesson_id}, {'_id': 0})
     return Lesson(**updated_lesson)
 
 @api_router.delete("/lessons/{lesson_id}")
 async def delete_lesson(lesson_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.lessons.delete_one({'id': lesson_id, 'teacher_id': current_user.id})
+    deleted = await db.lessons.find_one_and_delete(
+        {'id': lesson_id, 'teacher_id': current_user.id}, projection={'_id': 0, 'student_id': 1}
+    )
     
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Ders bulunamadı")
+    await _schedule_changed(current_user.id)
+    await _student_data_changed(deleted['student_id'])
     
     return {"message": "Ders silindi"}
 
+def _completion_session(lesson: dict, teacher_id: str, topic: str, weaknesses: str, homework: str,
+                        note: str, now: datetime) -> dict:
+    return {
+        'id': str(uuid.uuid4()),
+        'lesson_id': lesson['id'],
+        'student_id': lesson['student_id'],
+        'teacher_id': teacher_id,
+        'date': now.strftime('%Y-%m-%d'),
+        'start_time': lesson['start_time'],
+        'end_time': lesson['end_time'],
+        'topic': topic,
+        'note': note,
+        'evaluation': f"Eksikler: {weaknesses}\nÖdev: {homework}",
+        'status': 'completed',
+        'material_path': None,
+        'created_at': now.isoformat()
+    }
+
+def _completion_payment(lesson: dict, student: Optional[dict], teacher_id: str, now: datetime) -> Optional[dict]:
+    # Debt for the lesson from the student's hourly rate and the lesson duration
+    if not student or not student.get('hourly_rate'):
+        return None
+    duration_hours = (_to_minutes(lesson['end_time']) - _to_minutes(lesson['start_time'])) / 60
+    return {
+        'id': str(uuid.uuid4()),
+        'student_id': lesson['student_id'],
+        'teacher_id': teacher_id,
+        'amount': student['hourly_rate'] * duration_hours,
+        'date': now.strftime('%Y-%m-%d'),
+        'status': 'Beklemede',
+        'created_at': now.isoformat()
+    }
+
+@api_router.post("/lessons/complete-batch")
+async def complete_lessons_batch(payload: LessonCompleteBatch, current_user: User = Depends(get_current_user)):
+    # End-of-day close-out: two $in reads, then one write per collection
+    lesson_ids = list(dict.fromkeys(item.lesson_id for item in payload.completions))
+    lessons = {
+        lesson['id']: lesson
+        for lesson in await db.lessons.find(
+            {'id': {'$in': lesson_ids}, 'teacher_id': current_user.id},
+            {'_id': 0, 'id': 1, 'student_id': 1, 'start_time': 1, 'end_time': 1}
+        ).to_list(None)
+    }
+    student_ids = list({lesson['student_id'] for lesson in lessons.values()})
+    students = {
+        student['id']: student
+        for student in await db.students.find(
+            {'id': {'$in': student_ids}, 'teacher_id': current_user.id}, {'_id': 0, 'id': 1, 'hourly_rate': 1}
+        ).to_list(None)
+    } if student_ids else {}
+    
+    now = datetime.now(timezone.utc)
+    results = []
+    session_docs = []
+    payment_docs = []
+    completed_ids = set()
+    for index, item in enumerate(payload.completions):
+        lesson = lessons.get(item.lesson_id)
+        if not lesson:
+            results.append({"index": index, "lesson_id": item.lesson_id, "status": "not_found"})
+            continue
+        if item.lesson_id in completed_ids:
+            # completing the same lesson twice would charge the student twice
+            results.append({"index": index, "lesson_id": item.lesson_id, "status": "duplicate"})
+            continue
+        completed_ids.add(item.lesson_id)
+        
+        session_dict = _completion_session(lesson, current_user.id, item.topic, item.weaknesses,
+                                           item.homework, item.note, now)
+        session_docs.append(session_dict)
+        payment_dict = _completion_payment(lesson, students.get(lesson['student_id']), current_user.id, now)
+        if payment_dict:
+            payment_docs.append(payment_dict)
+        results.append({
+            "index": index,
+            "lesson_id": item.lesson_id,
+            "status": "completed",
+            "session_id": session_dict['id'],
+            "payment_id": payment_dict['id'] if payment_dict else None,
+            "amount": payment_dict['amount'] if payment_dict else None
+        })
+    
+    if completed_ids:
+        await db.lessons.update_many({'id': {'$in': list(completed_ids)}}, {'$set': {'status': 'completed'}})
+        await db.sessions.insert_many(session_docs, ordered=False)
+        if payment_docs:
+            await db.payments.insert_many(payment_docs, ordered=False)
+        await _schedule_changed(current_user.id)
+        await _student_data_changed(*[session['student_id'] for session in session_docs])
+    
+    return {
+        "completed": len(completed_ids),
+        "total_amount": sum(payment['amount'] for payment in payment_docs),
+        "results": results
+    }
+
 @api_router.post("/lessons/{lesson_id}/complete-with-details")
 async def complete_lesson_with_details(
     lesson_id: str, 
@@ -934,63 +2237,55 @@ async def complete_lesson_with_details(
         {'id': lesson_id},
         {'$set': {'status': 'completed'}}
     )
+    await _schedule_changed(current_user.id)
     
-    # Create session record
-    session_dict = {
-        'id': str(uuid.uuid4()),
-        'lesson_id': lesson_id,
-        'student_id': lesson['student_id'],
-        'teacher_id': current_user.id,
-        'date': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
-        'start_time': lesson['start_time'],
-        'end_time': lesson['end_time'],
-        'topic': topic,
-        'note': note,
-        'evaluation': f"Eksikler: {weaknesses}\nÖdev: {homework}",
-        'status': 'completed',
-        'material_path': None,
-        'created_at': datetime.now(timezone.utc).isoformat()
-    }
+    now = datetime.now(timezone.utc)
     
+    # Create session record
+    session_dict = _completion_session(lesson, current_user.id, topic, weaknesses, homework, note, now)
     await db.sessions.insert_one(session_dict)
     
-    # Add debt to student (calculate from hourly rate and lesson duration)
+    # Add debt to student (calculate from hourly rate and lesson duration), as pending
     student = await db.students.find_one({'id': lesson['student_id']})
-    if student and student.get('hourly_rate'):
-        # Calculate lesson duration in hours
-        start_h, start_m = map(int, lesson['start_time'].split(':'))
-        end_h, end_m = map(int, lesson['end_time'].split(':'))
-        duration_hours = (end_h * 60 + end_m - start_h * 60 - start_m) / 60
-        
-        amount = student['hourly_rate'] * duration_hours
-        
-        # Create payment record as pending
-        payment_dict = {
-            'id': str(uuid.uuid4()),
-            'student_id': lesson['student_id'],
-            'teacher_id': current_user.id,
-            'amount': amount,
-            'date': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
-            'status': 'Beklemede',
-            'created_at': datetime.now(timezone.utc).isoformat()
-        }
-        
+    payment_dict = _completion_payment(lesson, student, current_user.id, now)
+    if payment_dict:
         await db.payments.insert_one(payment_dict)
+    await _student_data_changed(lesson['student_id'])
     
     return {"message": "Ders tamamlandı ve kaydedildi", "session_id": session_dict['id']}
 
 @api_router.post("/lessons/{lesson_id}/mark-not-attended")
 async def mark_lesson_not_attended(lesson_id: str, note: str = "", current_user: User = Depends(get_current_user)):
-    result = await db.lessons.update_one(
+    lesson = await db.lessons.find_one_and_update(
         {'id': lesson_id, 'teacher_id': current_user.id},
-        {'$set': {'status': 'not_attended', 'note': note}}
+        {'$set': {'status': 'not_attended', 'note': note}},
+        projection={'_id': 0, 'student_id': 1}
     )
     
-    if result.matched_count == 0:
+    if not lesson:
         raise HTTPException(status_code=404, detail="Ders bulunamadı")
+    await _schedule_changed(current_user.id)
+    await _student_data_changed(lesson['student_id'])
     
     return {"message": "Ders yapılmadı olarak işaretlendi"}
 
+async def _book_override(teacher_id: str, override_doc: dict, check) -> None:
+    async def write():
+        try:
+            await db.lesson_overrides.insert_one(dict(override_doc))
+        except DuplicateKeyError:
+            # (lesson_id, week_key) is unique; a concurrent request got there first
+            raise HTTPException(status_code=409, detail="Bu ders için bu haftada zaten bir erteleme yapılmış")
+
+    async def undo():
+        await db.lesson_overrides.delete_one({'id': override_doc['id']})
+
+    weekday = datetime.strptime(override_doc['new_date'], "%Y-%m-%d").weekday()
+    await schedule_booker.book(
+        teacher_id, _version_buckets(weekday, override_doc['new_start_min'], override_doc['new_end_min']),
+        check, write, undo
+    )
+
 @api_router.post("/lessons/{lesson_id}/not-attended-and-reschedule")
 async def not_attended_and_maybe_reschedule(
     lesson_id: str,
@@ -1007,6 +2302,8 @@ async def not_attended_and_maybe_reschedule(
         {'id': lesson_id, 'teacher_id': current_user.id},
         {'$set': {'status': 'not_attended', 'note': payload.reason}}
     )
+    await _schedule_changed(current_user.id)
+    await _student_data_changed(lesson['student_id'])
 
     result = {
         "message": "Ders yapılmadı olarak işaretlendi",
@@ -1027,27 +2324,14 @@ async def not_attended_and_maybe_reschedule(
 
     # 6) Bu ders için aynı hafta içinde daha önce override var mı?
     week_key = _iso_week_key(payload.original_date)
-    existing = await db.lesson_overrides.find_one({
+    existing = await _find_override({
         "lesson_id": lesson_id,
         "week_key": week_key
-    })
+    }, {"_id": 0, "id": 1}, week_key)
     if existing:
         raise HTTPException(status_code=409, detail="Bu ders için bu haftada zaten bir erteleme yapılmış")
 
-    # 7) Çakışma (öğretmenin diğer dersleri/override'ları ile) kontrolü
-    conflict = await _has_time_conflict_for_teacher(
-        db=db,
-        teacher_id=current_user.id,
-        target_date=payload.new_date,
-        start_time=payload.new_start_time,
-        end_time=payload.new_end_time,
-        exclude_lesson_id=lesson_id  # aynı dersin asıl saatiyle kıyaslarken dışla
-    )
-    if conflict:
-        # Frontend bu hatayı yakalayacak ve "bu slot dolu" şeklinde uyarı gösterecek
-        raise HTTPException(status_code=409, detail="Seçtiğiniz tarih/saatte başka bir dersiniz var")
-
-    # 8) Override kaydını oluştur
+    # 7) Override kaydı
     override_doc = {
         "id": str(uuid.uuid4()),
         "lesson_id": lesson_id,
@@ -1058,10 +2342,29 @@ async def not_attended_and_maybe_reschedule(
         "new_date": payload.new_date,
         "new_start_time": payload.new_start_time,
         "new_end_time": payload.new_end_time,
+        "new_start_min": _to_minutes(payload.new_start_time),
+        "new_end_min": _to_minutes(payload.new_end_time),
         "reason": payload.reason,  # mazereti override içine de yaz
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.lesson_overrides.insert_one(override_doc)
+
+    # 8) Çakışma kontrolü (öğretmenin diğer dersleri/override'ları ile) ve
+    #    kayıt, eşzamanlı rezervasyonlara karşı tek bir iyimser işlem olarak
+    async def check():
+        conflict = await _has_time_conflict_for_teacher(
+            db=db,
+            teacher_id=current_user.id,
+            target_date=payload.new_date,
+            start_time=payload.new_start_time,
+            end_time=payload.new_end_time,
+            exclude_lesson_id=lesson_id  # aynı dersin asıl saatiyle kıyaslarken dışla
+        )
+        if conflict:
+            # Frontend bu hatayı yakalayacak ve "bu slot dolu" şeklinde uyarı gösterecek
+            return HTTPException(status_code=409, detail="Seçtiğiniz tarih/saatte başka bir dersiniz var")
+        return None
+
+    await _book_override(current_user.id, override_doc, check)
 
     # 9) Dashboard zaten override’ları bu hafta için okuyup,
     #    'moved_from_today' ve 'moved_to_today' mantığıyla gösteriyor.
@@ -1090,26 +2393,14 @@ async def reschedule_lesson_once(
 
     # 3) Prevent duplicate override for the same lesson-week
     week_key = _iso_week_key(payload.original_date)
-    existing = await db.lesson_overrides.find_one({
+    existing = await _find_override({
         "lesson_id": lesson_id,
         "week_key": week_key
-    })
+    }, {"_id": 0, "id": 1}, week_key)
     if existing:
         raise HTTPException(status_code=409, detail="Bu ders için bu haftada zaten bir erteleme yapılmış")
 
-    # 4) Check conflicts (regular lessons and other overrides)
-    conflict = await _has_time_conflict_for_teacher(
-        db=db,
-        teacher_id=current_user.id,
-        target_date=payload.new_date,
-        start_time=payload.new_start_time,
-        end_time=payload.new_end_time,
-        exclude_lesson_id=lesson_id
-    )
-    if conflict:
-        raise HTTPException(status_code=409, detail="Seçtiğiniz tarih/saatte başka bir dersiniz var")
-
-    # 5) Create override document
+    # 4) Create override document
     override_doc = {
         "id": str(uuid.uuid4()),
         "lesson_id": lesson_id,
@@ -1120,13 +2411,365 @@ async def reschedule_lesson_once(
         "new_date": payload.new_date,
         "new_start_time": payload.new_start_time,
         "new_end_time": payload.new_end_time,
+        "new_start_min": _to_minutes(payload.new_start_time),
+        "new_end_min": _to_minutes(payload.new_end_time),
         "reason": payload.reason,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.lesson_overrides.insert_one(override_doc)
+
+    # 5) Check conflicts (regular lessons and other overrides) and insert
+    async def check():
+        conflict = await _has_time_conflict_for_teacher(
+            db=db,
+            teacher_id=current_user.id,
+            target_date=payload.new_date,
+            start_time=payload.new_start_time,
+            end_time=payload.new_end_time,
+            exclude_lesson_id=lesson_id
+        )
+        if conflict:
+            return HTTPException(status_code=409, detail="Seçtiğiniz tarih/saatte başka bir dersiniz var")
+        return None
+
+    await _book_override(current_user.id, override_doc, check)
 
     return {"message": "Ders aynı hafta içinde 1 kerelik ertelendi", "override_id": override_doc["id"]}
 
+# ============ CALENDAR ROUTES ============
+
+async def _schedule_version(teacher_id: str) -> int:
+    version_doc = await db.schedule_versions.find_one({'_id': teacher_id})
+    return version_doc.get('version', 0) if version_doc else 0
+
+def _schedule_etag(teacher_id: str, version: int, *parts: str) -> str:
+    digest = hashlib.sha256(':'.join([teacher_id, str(version), *parts]).encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+
+def _expand_calendar(lessons: List[dict], overrides: List[dict], students_by_id: dict,
+                     start: date, end: date) -> List[dict]:
+    """
+    Turn weekly lessons into dated occurrences between start and end
+    (inclusive) and apply one-time overrides by week_key, the same
+    "moved from / moved to" logic the dashboard uses for today.
+    """
+    moved_from = {(ov['lesson_id'], ov['original_date']) for ov in overrides}
+    lessons_by_weekday = {}
+    for lesson in lessons:
+        lessons_by_weekday.setdefault(lesson['day_of_week'], []).append(lesson)
+    lessons_by_id = {lesson['id']: lesson for lesson in lessons}
+
+    def _occurrence(lesson, date_str, start_time, end_time, status):
+        student = students_by_id.get(lesson['student_id'], {})
+        return {
+            'date': date_str,
+            'lesson_id': lesson['id'],
+            'student_id': lesson['student_id'],
+            'student_name': student.get('full_name'),
+            'start_time': start_time,
+            'end_time': end_time,
+            'topic': lesson.get('topic'),
+            'status': status
+        }
+
+    occurrences = []
+    day = start
+    while day <= end:
+        date_str = day.strftime('%Y-%m-%d')
+        for lesson in lessons_by_weekday.get(day.weekday(), []):
+            if lesson.get('created_at', '')[:10] > date_str:
+                continue  # weekly lesson did not exist yet
+            if (lesson['id'], date_str) in moved_from:
+                continue  # rescheduled away from this date
+            occurrences.append(_occurrence(lesson, date_str, lesson['start_time'], lesson['end_time'], lesson['status']))
+        day += timedelta(days=1)
+
+    start_str, end_str = start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+    for ov in overrides:
+        lesson = lessons_by_id.get(ov['lesson_id'])
+        if not lesson or not start_str <= ov['new_date'] <= end_str:
+            continue
+        occurrence = _occurrence(lesson, ov['new_date'], ov['new_start_time'], ov['new_end_time'], 'rescheduled')
+        occurrence.update({'override_id': ov['id'], 'original_date': ov['original_date'], 'reason': ov.get('reason')})
+        occurrences.append(occurrence)
+
+    occurrences.sort(key=lambda item: (item['date'], _to_minutes(item['start_time'])))
+    return occurrences
+
+@api_router.get("/calendar")
+async def get_calendar(request: Request, from_date: str = Query(..., alias="from"), to_date: str = Query(..., alias="to"),
+                       current_user: User = Depends(get_current_user)):
+    try:
+        start = datetime.strptime(from_date, "%Y-%m-%d").date()
+        end = datetime.strptime(to_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz tarih formatı (YYYY-MM-DD)")
+    if end < start or (end - start).days >= CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Tarih aralığı en fazla {CALENDAR_MAX_DAYS} gün olabilir")
+    
+    # The schedule version changes on every lesson/override write, so a
+    # matching ETag means nothing in the range can have changed
+    version = await _schedule_version(current_user.id)
+    etag = _schedule_etag(current_user.id, version, from_date, to_date)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    week_keys = sorted({_iso_week_key((start + timedelta(days=i)).strftime('%Y-%m-%d'))
+                        for i in range((end - start).days + 1)})
+    lessons, overrides = await asyncio.gather(
+        db.lessons.find(
+            {'teacher_id': current_user.id, 'status': {'$ne': 'cancelled'}},
+            {'_id': 0, 'id': 1, 'student_id': 1, 'day_of_week': 1, 'start_time': 1, 'end_time': 1,
+             'topic': 1, 'status': 1, 'created_at': 1}
+        ).to_list(None),
+        _find_overrides({'teacher_id': current_user.id, 'week_key': {'$in': week_keys}}, {'_id': 0}, week_keys)
+    )
+    student_ids = list({lesson['student_id'] for lesson in lessons})
+    students_by_id = {
+        student['id']: student
+        for student in await db.students.find({'id': {'$in': student_ids}}, {'_id': 0, 'id': 1, 'full_name': 1}).to_list(None)
+    } if student_ids else {}
+    
+    return JSONResponse(
+        content={
+            'from': from_date,
+            'to': to_date,
+            'version': version,
+            'occurrences': _expand_calendar(lessons, overrides, students_by_id, start, end)
+        },
+        headers=headers
+    )
+
+def _ics_escape(text: str) -> str:
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def _ics_line(line: str) -> str:
+    # Fold at 75 octets (RFC 5545 3.1) without splitting a UTF-8 sequence
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    current = ''
+    limit = 75
+    for char in line:
+        if len((current + char).encode('utf-8')) > limit:
+            parts.append(current)
+            current = ''
+            limit = 74  # continuation lines start with a space
+        current += char
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
+
+def _ics_local(date_str: str, hhmm: str) -> str:
+    return f"{date_str.replace('-', '')}T{hhmm.replace(':', '')}00"
+
+def _ics_utc_offset(delta: timedelta) -> str:
+    minutes = int(delta.total_seconds()) // 60
+    sign = '-' if minutes < 0 else '+'
+    return f"{sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}"
+
+@lru_cache(maxsize=8)
+def _ics_vtimezone(tzid: str, year: int) -> tuple:
+    """
+    VTIMEZONE for the TZID every event uses (RFC 5545 3.6.5). The zone's
+    offset changes in `year` become yearly rules; a zone without DST, such
+    as Europe/Istanbul since 2016, gets a single fixed STANDARD observance.
+    """
+    zone = ZoneInfo(tzid)
+    start = datetime(year, 1, 1, tzinfo=timezone.utc)
+    transitions = []
+    previous = start.astimezone(zone).utcoffset()
+    for hour in range(1, 366 * 24):
+        moment = start + timedelta(hours=hour)
+        current = moment.astimezone(zone).utcoffset()
+        if current != previous:
+            transitions.append((moment, previous, current))
+            previous = current
+    
+    lines = ['BEGIN:VTIMEZONE', f"TZID:{tzid}"]
+    if not transitions:
+        local = start.astimezone(zone)
+        offset = _ics_utc_offset(local.utcoffset())
+        lines += [
+            'BEGIN:STANDARD', 'DTSTART:19700101T000000',
+            f"TZOFFSETFROM:{offset}", f"TZOFFSETTO:{offset}", f"TZNAME:{local.tzname()}",
+            'END:STANDARD'
+        ]
+    for moment, before, after in transitions:
+        local = moment.astimezone(zone)
+        wall = (moment + before).replace(tzinfo=None)  # the transition in the old offset
+        week = -1 if (wall + timedelta(days=7)).month != wall.month else (wall.day - 1) // 7 + 1
+        weekday = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU'][wall.weekday()]
+        kind = 'DAYLIGHT' if local.dst() else 'STANDARD'
+        # Rules start in 1970, on the 1970 day matching them, so older lessons are covered
+        month_start = date(1970, wall.month, 1)
+        candidates = [month_start + timedelta(days=n) for n in range(31)]
+        candidates = [day for day in candidates if day.month == wall.month and day.weekday() == wall.weekday()]
+        onset = candidates[week - 1 if week > 0 else -1]
+        lines += [
+            f"BEGIN:{kind}", f"DTSTART:{onset.strftime('%Y%m%d')}T{wall.strftime('%H%M%S')}",
+            f"RRULE:FREQ=YEARLY;BYMONTH={wall.month};BYDAY={week}{weekday}",
+            f"TZOFFSETFROM:{_ics_utc_offset(before)}", f"TZOFFSETTO:{_ics_utc_offset(after)}",
+            f"TZNAME:{local.tzname()}", f"END:{kind}"
+        ]
+    lines.append('END:VTIMEZONE')
+    return tuple(lines)
+
+def _ics_event(lesson: dict, overrides: List[dict], student_name: Optional[str], dtstamp: str) -> str:
+    # First occurrence: the lesson's weekday on or after the day it was created
+    created = datetime.strptime(lesson.get('created_at', '')[:10] or '1970-01-01', "%Y-%m-%d").date()
+    first = created + timedelta(days=(lesson['day_of_week'] - created.weekday()) % 7)
+    first_str = first.strftime('%Y-%m-%d')
+    tzid = f"TZID={CALENDAR_TZ}"
+    summary = student_name or 'Ders'
+    if lesson.get('topic'):
+        summary = f"{summary} - {lesson['topic']}"
+
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:{lesson['id']}@mentra",
+        f"DTSTAMP:{dtstamp}",
+        f"DTSTART;{tzid}:{_ics_local(first_str, lesson['start_time'])}",
+        f"DTEND;{tzid}:{_ics_local(first_str, lesson['end_time'])}",
+        'RRULE:FREQ=WEEKLY',
+        f"SUMMARY:{_ics_escape(summary)}"
+    ]
+    # One-time reschedules: drop the original occurrence, add the moved one
+    for ov in overrides:
+        lines.append(f"EXDATE;{tzid}:{_ics_local(ov['original_date'], lesson['start_time'])}")
+        lines.append(
+            f"RDATE;{tzid};VALUE=PERIOD:{_ics_local(ov['new_date'], ov['new_start_time'])}"
+            f"/{_ics_local(ov['new_date'], ov['new_end_time'])}"
+        )
+    lines.append('END:VEVENT')
+    return ''.join(_ics_line(line) for line in lines)
+
+class _IcsFeedCache:
+    """
+    Rendered ICS feeds keyed by teacher and schedule version. A feed is
+    only stored once it has been streamed completely; a version bump makes
+    the old body unreachable and it is replaced on the next poll.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # teacher_id -> (version, body)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, teacher_id: str, version: int) -> Optional[bytes]:
+        entry = self._entries.get(teacher_id)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(teacher_id)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, teacher_id: str, version: int, body: bytes) -> None:
+        current = self._entries.get(teacher_id)
+        if current is not None and current[0] > version:
+            return
+        self._entries[teacher_id] = (version, body)
+        self._entries.move_to_end(teacher_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+ics_feed_cache = _IcsFeedCache(ICS_CACHE_MAX_SIZE)
+
+async def _render_ics_feed(teacher: dict, version: int):
+    """Yield the feed event by event and cache the full body at the end."""
+    dtstamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    chunks = []
+
+    def emit(chunk: str) -> bytes:
+        data = chunk.encode('utf-8')
+        chunks.append(data)
+        return data
+
+    yield emit(''.join(_ics_line(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Mentra//Ders Programi//TR',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f"X-WR-CALNAME:{_ics_escape('Mentra - ' + teacher.get('full_name', ''))}",
+        f"X-WR-TIMEZONE:{CALENDAR_TZ}",
+        *_ics_vtimezone(CALENDAR_TZ, datetime.now(timezone.utc).year)
+    ]))
+
+    lessons, overrides = await asyncio.gather(
+        db.lessons.find(
+            {'teacher_id': teacher['id'], 'status': {'$ne': 'cancelled'}},
+            {'_id': 0, 'id': 1, 'student_id': 1, 'day_of_week': 1, 'start_time': 1, 'end_time': 1,
+             'topic': 1, 'created_at': 1}
+        ).sort('id', 1).to_list(None),
+        _find_overrides(
+            {'teacher_id': teacher['id']},
+            {'_id': 0, 'lesson_id': 1, 'original_date': 1, 'new_date': 1, 'new_start_time': 1, 'new_end_time': 1}
+        )
+    )
+    overrides_by_lesson = {}
+    for ov in overrides:
+        overrides_by_lesson.setdefault(ov['lesson_id'], []).append(ov)
+    student_ids = list({lesson['student_id'] for lesson in lessons})
+    names = {
+        student['id']: student.get('full_name')
+        for student in await db.students.find({'id': {'$in': student_ids}}, {'_id': 0, 'id': 1, 'full_name': 1}).to_list(None)
+    } if student_ids else {}
+
+    for lesson in lessons:
+        yield emit(_ics_event(
+            lesson, sorted(overrides_by_lesson.get(lesson['id'], []), key=lambda ov: ov['original_date']),
+            names.get(lesson['student_id']), dtstamp
+        ))
+    yield emit(_ics_line('END:VCALENDAR'))
+    ics_feed_cache.put(teacher['id'], version, b''.join(chunks))
+
+@api_router.post("/calendar/token")
+async def create_calendar_token(current_user: User = Depends(get_current_user)):
+    # Creating a token again rotates it; the old feed URL stops working
+    token = secrets.token_urlsafe(24)
+    await db.users.update_one({'id': current_user.id}, {'$set': {'calendar_token': token}})
+    return {"token": token, "url": f"/api/calendar/{token}.ics"}
+
+@api_router.delete("/calendar/token")
+async def revoke_calendar_token(current_user: User = Depends(get_current_user)):
+    await db.users.update_one({'id': current_user.id}, {'$unset': {'calendar_token': ''}})
+    return {"message": "Takvim bağlantısı iptal edildi"}
+
+@api_router.get("/calendar/{token}.ics")
+async def get_calendar_feed(token: str, request: Request):
+    # Public (token-authenticated) feed polled by calendar apps
+    teacher = await db.users.find_one({'calendar_token': token}, {'_id': 0, 'id': 1, 'full_name': 1})
+    if not teacher:
+        raise HTTPException(status_code=404, detail="Takvim bulunamadı")
+    
+    version = await _schedule_version(teacher['id'])
+    etag = _schedule_etag(teacher['id'], version, 'ics')
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    media_type = "text/calendar; charset=utf-8"
+    body = ics_feed_cache.get(teacher['id'], version)
+    if body is not None:
+        return Response(content=body, media_type=media_type, headers=headers)
+    return StreamingResponse(_render_ics_feed(teacher, version), media_type=media_type, headers=headers)
+
 # ============ SESSION ROUTES ============
 
 @api_router.post("/sessions", response_model=Session)
@@ -1137,15 +2780,18 @@ async def create_session(session_data: SessionCreate, current_user: User = Depen
     session_dict['created_at'] = datetime.now(timezone.utc).isoformat()
     
     await db.sessions.insert_one(session_dict)
+    await _student_data_changed(session_dict['student_id'])
     return Session(**session_dict)
 
 @api_router.get("/sessions", response_model=List[Session])
-async def get_sessions(student_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
+async def get_sessions(response: Response, student_id: Optional[str] = None,
+                      limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX), cursor: Optional[str] = None,
+                      current_user: User = Depends(get_current_user)):
     query = {'teacher_id': current_user.id}
     if student_id:
         query['student_id'] = student_id
     
-    sessions = await db.sessions.find(query, {'_id': 0}).to_list(1000)
+    sessions = await _paginate(db.sessions, query, response, limit, cursor)
     return [Session(**s) for s in sessions]
 
 @api_router.post("/sessions/upload-material")
@@ -1162,6 +2808,59 @@ async def upload_material(file: UploadFile = File(...), current_user: User = Dep
 
 # ============ PAYMENT ROUTES ============
 
+async def payment_totals(teacher_id: str, student_ids: Optional[List[str]] = None,
+                         statuses: Optional[List[str]] = None,
+                         start_date: Optional[str] = None, end_date: Optional[str] = None,
+                         by_student: bool = False) -> dict:
+    """
+    Sum payment amounts by status inside Mongo. Returns {status: total}, or
+    {student_id: {status: total}} when by_student is set. Only the filtered
+    fields, status and amount (plus student_id when grouping by it) are
+    touched, so the registry indexes on payments cover the whole pipeline.
+    """
+    match = {'teacher_id': teacher_id}
+    if student_ids is not None:
+        match['student_id'] = student_ids[0] if len(student_ids) == 1 else {'$in': student_ids}
+    if statuses is not None:
+        match['status'] = statuses[0] if len(statuses) == 1 else {'$in': statuses}
+    if start_date or end_date:
+        match['date'] = {}
+        if start_date:
+            match['date']['$gte'] = start_date
+        if end_date:
+            match['date']['$lte'] = end_date
+    
+    group_id = {'status': '$status'}
+    projection = {'_id': 0, 'status': 1, 'amount': 1}
+    if by_student:
+        group_id['student_id'] = '$student_id'
+        projection['student_id'] = 1
+    pipeline = [
+        {'$match': match},
+        {'$project': projection},
+        {'$group': {'_id': group_id, 'total': {'$sum': '$amount'}}}
+    ]
+    
+    totals = {}
+    async for row in db.payments.aggregate(pipeline):
+        if by_student:
+            totals.setdefault(row['_id']['student_id'], {})[row['_id']['status']] = row['total']
+        else:
+            totals[row['_id']['status']] = row['total']
+    return totals
+
+@api_router.get("/payments/totals")
+async def get_payment_totals(student_id: Optional[str] = None, group_by: Optional[str] = None,
+                             start_date: Optional[str] = None, end_date: Optional[str] = None,
+                             current_user: User = Depends(get_current_user)):
+    return await payment_totals(
+        current_user.id,
+        student_ids=[student_id] if student_id else None,
+        start_date=start_date,
+        end_date=end_date,
+        by_student=group_by == 'student'
+    )
+
 @api_router.post("/payments", response_model=Payment)
 async def create_payment(payment_data: PaymentCreate, current_user: User = Depends(get_current_user)):
     payment_dict = payment_data.model_dump()
@@ -1170,267 +2869,385 @@ async def create_payment(payment_data: PaymentCreate, current_user: User = Depen
     payment_dict['created_at'] = datetime.now(timezone.utc).isoformat()
     
     await db.payments.insert_one(payment_dict)
+    await _student_data_changed(payment_dict['student_id'])
     return Payment(**payment_dict)
 
 @api_router.get("/payments", response_model=List[Payment])
-async def get_payments(student_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
+async def get_payments(response: Response, student_id: Optional[str] = None,
+                      limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX), cursor: Optional[str] = None,
+                      current_user: User = Depends(get_current_user)):
     query = {'teacher_id': current_user.id}
     if student_id:
         query['student_id'] = student_id
     
-    payments = await db.payments.find(query, {'_id': 0}).to_list(1000)
+    payments = await _paginate(db.payments, query, response, limit, cursor)
     return [Payment(**p) for p in payments]
 
 @api_router.put("/payments/{payment_id}", response_model=Payment)
 async def update_payment(payment_id: str, payment_data: PaymentCreate, current_user: User = Depends(get_current_user)):
-    result = await db.payments.update_one(
+    previous = await db.payments.find_one_and_update(
         {'id': payment_id, 'teacher_id': current_user.id},
-        {'$set': payment_data.model_dump()}
+        {'$set': payment_data.model_dump()},
+        projection={'_id': 0, 'student_id': 1}
     )
     
-    if result.matched_count == 0:
+    if not previous:
         raise HTTPException(status_code=404, detail="Ödeme bulunamadı")
+    await _student_data_changed(previous['student_id'], payment_data.student_id)
     
     updated_payment = await db.payments.find_one({'id': payment_id}, {'_id': 0})
     return Payment(**updated_payment)
 
 @api_router.patch("/payments/{payment_id}/status")
 async def update_payment_status(payment_id: str, status: str, current_user: User = Depends(get_current_user)):
-    result = await db.payments.update_one(
+    payment = await db.payments.find_one_and_update(
         {'id': payment_id, 'teacher_id': current_user.id},
-        {'$set': {'status': status}}
+        {'$set': {'status': status}},
+        projection={'_id': 0, 'student_id': 1}
     )
     
-    if result.matched_count == 0:
+    if not payment:
         raise HTTPException(status_code=404, detail="Ödeme bulunamadı")
+    await _student_data_changed(payment['student_id'])
     
     updated_payment = await db.payments.find_one({'id': payment_id}, {'_id': 0})
     return Payment(**updated_payment)
 
 @api_router.delete("/payments/{payment_id}")
 async def delete_payment(payment_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.payments.delete_one({'id': payment_id, 'teacher_id': current_user.id})
+    deleted = await db.payments.find_one_and_delete(
+        {'id': payment_id, 'teacher_id': current_user.id}, projection={'_id': 0, 'student_id': 1}
+    )
     
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Ödeme bulunamadı")
+    await _student_data_changed(deleted['student_id'])
     
     return {"message": "Ödeme silindi"}
 
 # ============ REPORT ROUTES ============
 
+async def _load_report_data(teacher_id: str, student_id: str, start_date: str, end_date: str) -> Optional[dict]:
+    # Everything the report renderer needs, as plain picklable data
+    student, lessons, sessions, totals = await asyncio.gather(
+        db.students.find_one({'id': student_id, 'teacher_id': teacher_id}, {'_id': 0}),
+        db.lessons.find({
+            'student_id': student_id,
+            'teacher_id': teacher_id
+        }, {'_id': 0}).to_list(1000),
+        db.sessions.find({
+            'student_id': student_id,
+            'teacher_id': teacher_id,
+            'date': {'$gte': start_date, '$lte': end_date}
+        }, {'_id': 0}).to_list(1000),
+        payment_totals(teacher_id, student_ids=[student_id], start_date=start_date, end_date=end_date)
+    )
+    if not student:
+        return None
+    return {
+        'student': student,
+        'lessons': lessons,
+        'sessions': sessions,
+        'totals': totals,
+        'start_date': start_date,
+        'end_date': end_date
+    }
+
+class _ReportCache:
+    """
+    Rendered report PDFs on disk, keyed by (student_id, start_date,
+    end_date, data_version). Any write to the student's lessons, sessions
+    or payments bumps data_version, so stale files are never hit; they age
+    out once the directory passes max_bytes, least recently served first
+    (file mtime is the recency clock).
+    """
+    def __init__(self, directory: Path, max_bytes: int, min_age_seconds: float = 60):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_age_seconds = min_age_seconds  # never evict a file that may still be streaming
+        self._size = None
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> task rendering it
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(student_id: str, start_date: str, end_date: str, data_version: int) -> str:
+        raw = json.dumps([student_id, start_date, end_date, data_version])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.pdf"
+
+    def lookup(self, key: str) -> Optional[Path]:
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def store(self, key: str, pdf: bytes) -> Path:
+        # Blocking; run in a worker thread
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(pdf)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.pdf'))
+            else:
+                self._size += len(pdf)
+            if self._size > self.max_bytes:
+                self._evict(keep=str(path))
+        return path
+
+    def _evict(self, keep: str) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.min_age_seconds
+        target = self.max_bytes * 0.9  # evict a little extra so every store does not rescan
+        for mtime, size, entry_path in entries:
+            if self._size <= target or mtime > cutoff:
+                break
+            if entry_path == keep:
+                continue
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+            self.evictions += 1
+
+    async def get_or_render(self, key: str, render) -> Path:
+        """Cached file for key; concurrent misses for the same key render once."""
+        path = self.lookup(key)
+        if path is not None:
+            return path
+        task = self._inflight.get(key)
+        if task is None:
+            async def _render_and_store():
+                try:
+                    pdf = await render()
+                    return await asyncio.to_thread(self.store, key, pdf)
+                finally:
+                    self._inflight.pop(key, None)
+            task = self._inflight[key] = asyncio.ensure_future(_render_and_store())
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "rendering": len(self._inflight)
+        }
+
+report_cache = _ReportCache(REPORT_CACHE_DIR, REPORT_CACHE_MAX_BYTES)
+
+async def render_report(teacher_id: str, data: dict) -> bytes:
+    # ReportLab is CPU bound: render in the process pool, at most
+    # REPORT_RENDER_PER_TEACHER reports of one teacher at a time
+    return await report_render_limiter.run(teacher_id, report_pdf_executor.run, render_report_pdf, data)
+
 @api_router.get("/reports/pdf/{student_id}")
-async def generate_pdf_report(student_id: str, start_date: str = Query(...), end_date: str = Query(...), 
+async def generate_pdf_report(student_id: str, request: Request, start_date: str = Query(...), end_date: str = Query(...), 
                              current_user: User = Depends(get_current_user)):
-    # Get student
-    student = await db.students.find_one({'id': student_id, 'teacher_id': current_user.id}, {'_id': 0})
+    student = await db.students.find_one({'id': student_id, 'teacher_id': current_user.id}, {'_id': 0, 'id': 1, 'data_version': 1})
     if not student:
         raise HTTPException(status_code=404, detail="Öğrenci bulunamadı")
     
-    # Get lessons in date range
-    lessons = await db.lessons.find({
-        'student_id': student_id,
-        'teacher_id': current_user.id
-    }, {'_id': 0}).to_list(1000)
-    
-    # Get sessions in date range
-    sessions = await db.sessions.find({
-        'student_id': student_id,
-        'teacher_id': current_user.id,
-        'date': {'$gte': start_date, '$lte': end_date}
-    }, {'_id': 0}).to_list(1000)
-    
-    # Get payments in date range
-    payments = await db.payments.find({
-        'student_id': student_id,
-        'teacher_id': current_user.id,
-        'date': {'$gte': start_date, '$lte': end_date}
-    }, {'_id': 0}).to_list(1000)
-    
-    # Create PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    
-    # Styles
-    styles = getSampleStyleSheet()
+    key = report_cache.key(student_id, start_date, end_date, student.get('data_version', 0))
+    # Use ASCII-safe filename
+    from urllib.parse import quote
+    filename = f"rapor_{student_id}.pdf"
+    headers = {
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+        "ETag": f'"{key}"',
+        "Cache-Control": "private, no-cache"
+    }
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    async def render():
+        data = await _load_report_data(current_user.id, student_id, start_date, end_date)
+        if not data:
+            raise HTTPException(status_code=404, detail="Öğrenci bulunamadı")
+        return await render_report(current_user.id, data)
+    
+    path = await report_cache.get_or_render(key, render)
+    return FileResponse(path, media_type="application/pdf", headers=headers)
+
+async def _load_bulk_report_data(teacher_id: str, students: List[dict], start_date: str, end_date: str) -> dict:
+    # _load_report_data for many students with one query per collection: student_id -> data
+    student_ids = [student['id'] for student in students]
+    lessons, sessions, totals = await asyncio.gather(
+        db.lessons.find({'teacher_id': teacher_id, 'student_id': {'$in': student_ids}}, {'_id': 0}).to_list(None),
+        db.sessions.find({
+            'teacher_id': teacher_id,
+            'student_id': {'$in': student_ids},
+            'date': {'$gte': start_date, '$lte': end_date}
+        }, {'_id': 0}).to_list(None),
+        payment_totals(teacher_id, student_ids=student_ids, start_date=start_date, end_date=end_date, by_student=True)
+    )
+    data = {
+        student['id']: {
+            'student': student,
+            'lessons': [],
+            'sessions': [],
+            'totals': totals.get(student['id'], {}),
+            'start_date': start_date,
+            'end_date': end_date
+        }
+        for student in students
+    }
+    for lesson in lessons:
+        data[lesson['student_id']]['lessons'].append(lesson)
+    for session in sessions:
+        data[session['student_id']]['sessions'].append(session)
+    return data
+
+class _ZipSink:
+    """
+    Write-only, non-seekable target for zipfile, which then emits data
+    descriptors instead of seeking back. drain() returns what was written
+    since the last call so it can be streamed out.
+    """
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def _stream_reports_zip(entries: List[tuple], prefetch: int):
+    """
+    entries: (file name, coroutine function returning a cached PDF path), in
+    archive order. Up to `prefetch` reports render ahead of the one being
+    written; PDFs are copied from disk in chunks, so memory stays flat however
+    many students there are. The response has already started, so a report
+    that fails to render is listed in errors.txt at the end of the archive
+    instead of cutting the stream short.
+    """
+    sink = _ZipSink()
+    pending = deque()
+    failures = []
+    upcoming = iter(entries)
+    
+    def _schedule():
+        while len(pending) < prefetch:
+            entry = next(upcoming, None)
+            if entry is None:
+                return
+            arcname, fetch = entry
+            pending.append((arcname, asyncio.ensure_future(fetch())))
     
-    # Check if Turkish font is available
     try:
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontName='DejaVuSans',
-            fontSize=20,
-            textColor=colors.HexColor('#9333ea'),
-            spaceAfter=30,
-            alignment=1  # Center
-        )
-        
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontName='DejaVuSans',
-            fontSize=10
-        )
-        
-        table_style_font = 'DejaVuSans'
-    except:
-        # Fallback to Helvetica if DejaVuSans not available
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            textColor=colors.HexColor('#9333ea'),
-            spaceAfter=30,
-            alignment=1
-        )
-        
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10
-        )
-        
-        table_style_font = 'Helvetica'
-    
-    # Title
-    title = Paragraph(f"Veli Raporu — {student['full_name']}", title_style)
-    elements.append(title)
-    
-    # Date range
-    date_text = Paragraph(f"Tarih Aralığı: {start_date} - {end_date}", normal_style)
-    elements.append(date_text)
-    elements.append(Spacer(1, 0.5*cm))
-    
-    # Student info
-    info_text = Paragraph(f"<b>Öğrenci:</b> {student['full_name']}<br/><b>Sınıf:</b> {student.get('grade', 'Belirtilmemiş')}", normal_style)
-    elements.append(info_text)
-    elements.append(Spacer(1, 0.5*cm))
-    
-    # Lessons table
-    if lessons:
-        elements.append(Paragraph("<b>Dersler ve Notlar</b>", normal_style))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        lesson_data = [['Gün', 'Saat', 'Konu', 'Durum', 'Not']]
-        days = ['Pazartesi', 'Salı', 'Çarşamba', 'Perşembe', 'Cuma', 'Cumartesi', 'Pazar']
-        
-        for lesson in lessons:
-            status_text = ''
-            if lesson['status'] == 'completed':
-                status_text = 'Tamamlandı'
-            elif lesson['status'] == 'not_attended':
-                status_text = 'Yapılmadı'
-            elif lesson['status'] == 'cancelled':
-                status_text = 'İptal'
-            else:
-                status_text = 'Planlandı'
-                
-            lesson_data.append([
-                days[lesson['day_of_week']],
-                f"{lesson['start_time']}-{lesson['end_time']}",
-                lesson.get('topic', '-'),
-                status_text,
-                lesson.get('note', '-')
-            ])
-        
-        lesson_table = Table(lesson_data, colWidths=[2.5*cm, 2.5*cm, 4*cm, 2.5*cm, 5*cm])
-        lesson_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#9333ea')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), table_style_font),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        elements.append(lesson_table)
-        elements.append(Spacer(1, 0.5*cm))
-    
-    # Sessions table
-    if sessions:
-        elements.append(Paragraph("<b>Ders Detayları</b>", normal_style))
-        elements.append(Spacer(1, 0.3*cm))
-        
-        session_data = [['Tarih', 'Konu', 'Değerlendirme']]
-        for session in sessions:
-            session_data.append([
-                session['date'],
-                session.get('topic', '-'),
-                session.get('evaluation', '-')
-            ])
-        
-        session_table = Table(session_data, colWidths=[3*cm, 7*cm, 7*cm])
-        session_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#db2777')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), table_style_font),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        elements.append(session_table)
-        elements.append(Spacer(1, 0.5*cm))
-    
-    # Summary
-    total_lessons = len([l for l in lessons if l['status'] in ['completed', 'not_attended']])
-    total_paid = sum([p['amount'] for p in payments if p['status'] == 'Ödendi'])
-    total_pending = sum([p['amount'] for p in payments if p['status'] == 'Beklemede'])
-    
-    summary_text = f"""<b>Özet</b><br/>
-    Toplam Ders: {total_lessons}<br/>
-    Ödenen: {total_paid} TL<br/>
-    Bekleyen: {total_pending} TL
-    """
-    elements.append(Paragraph(summary_text, normal_style))
+        # PDFs are already compressed; storing them keeps the event loop free
+        with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+            _schedule()
+            while pending:
+                arcname, task = pending.popleft()
+                try:
+                    path = await task
+                except HTTPException as e:
+                    failures.append(f"{arcname}: {e.detail}")
+                    _schedule()
+                    continue
+                except Exception as e:
+                    logger.exception(f"Bulk report render failed ({arcname})")
+                    failures.append(f"{arcname}: Rapor oluşturulamadı")
+                    _schedule()
+                    continue
+                _schedule()
+                with archive.open(arcname, mode='w') as member:
+                    async with aiofiles.open(path, 'rb') as f:
+                        while chunk := await f.read(REPORT_ZIP_CHUNK_BYTES):
+                            member.write(chunk)
+                            yield sink.drain()
+                yield sink.drain()
+            if failures:
+                archive.writestr('errors.txt', '\n'.join(failures) + '\n')
+        yield sink.drain()  # central directory
+    finally:
+        # Client went away: drop the lookahead
+        for _, task in pending:
+            task.cancel()
+
+@api_router.post("/reports/bulk")
+async def generate_bulk_reports(payload: ReportBulkRequest, current_user: User = Depends(get_current_user)):
+    query = {'teacher_id': current_user.id}
+    if payload.student_ids is not None:
+        query['id'] = {'$in': payload.student_ids}
+    students = await db.students.find(query, {'_id': 0}).sort('full_name', 1).to_list(None)
+    if not students:
+        raise HTTPException(status_code=404, detail="Öğrenci bulunamadı")
     
-    doc.build(elements)
-    buffer.seek(0)
+    # Cached reports are reused; data is loaded (in bulk) only for the misses
+    keys = {
+        student['id']: report_cache.key(student['id'], payload.start_date, payload.end_date, student.get('data_version', 0))
+        for student in students
+    }
+    missing = [student for student in students if not report_cache.path(keys[student['id']]).exists()]
+    data = await _load_bulk_report_data(current_user.id, missing, payload.start_date, payload.end_date) if missing else {}
+    
+    def _fetcher(student_id: str):
+        async def render():
+            report_data = data.get(student_id)
+            if report_data is None:
+                # Evicted since the check above
+                report_data = await _load_report_data(current_user.id, student_id, payload.start_date, payload.end_date)
+                if not report_data:
+                    raise HTTPException(status_code=404, detail="Öğrenci bulunamadı")
+            return await render_report(current_user.id, report_data)
+        return lambda: report_cache.get_or_render(keys[student_id], render)
+    
+    entries = []
+    for index, student in enumerate(students, start=1):
+        name = re.sub(r'[^\w.-]+', '_', student.get('full_name') or '').strip('_') or student['id']
+        entries.append((f"{index:03d}_{name}.pdf", _fetcher(student['id'])))
     
-    # Use ASCII-safe filename
     from urllib.parse import quote
-    filename = f"rapor_{student['id']}.pdf"
-    
+    filename = f"raporlar_{payload.start_date}_{payload.end_date}.zip"
     return StreamingResponse(
-        buffer, 
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"
-        }
+        _stream_reports_zip(entries, REPORT_BULK_PREFETCH),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
     )
 
-@api_router.post("/reports/email/{student_id}")
-async def email_report(student_id: str, start_date: str = Query(...), end_date: str = Query(...),
-                      current_user: User = Depends(get_current_user)):
-    # Get student
-    student = await db.students.find_one({'id': student_id, 'teacher_id': current_user.id}, {'_id': 0})
-    if not student or not student.get('guardian_email'):
-        raise HTTPException(status_code=400, detail="Öğrenci bulunamadı veya veli email adresi yok")
-    
-    # Generate PDF (reuse the logic)
-    lessons = await db.lessons.find({
-        'student_id': student_id,
-        'teacher_id': current_user.id
-    }, {'_id': 0}).to_list(1000)
-    
-    sessions = await db.sessions.find({
-        'student_id': student_id,
-        'teacher_id': current_user.id,
-        'date': {'$gte': start_date, '$lte': end_date}
-    }, {'_id': 0}).to_list(1000)
-    
-    payments = await db.payments.find({
-        'student_id': student_id,
-        'teacher_id': current_user.id,
-        'date': {'$gte': start_date, '$lte': end_date}
-    }, {'_id': 0}).to_list(1000)
+def _report_email_body(data: dict, teacher_name: str) -> str:
+    # Plain-text report for the guardian, from _load_report_data() output
+    student = data['student']
+    lessons = data['lessons']
+    totals = data['totals']
     
     total_lessons = len([l for l in lessons if l['status'] in ['completed', 'not_attended']])
-    total_paid = sum([p['amount'] for p in payments if p['status'] == 'Ödendi'])
-    total_pending = sum([p['amount'] for p in payments if p['status'] == 'Beklemede'])
+    total_paid = totals.get('Ödendi', 0)
+    total_pending = totals.get('Beklemede', 0)
     
     # Create lessons summary with notes
     lessons_text = ""
@@ -1441,10 +3258,10 @@ async def email_report(student_id: str, start_date: str = Query(...), end_date:
         if lesson.get('note'):
             lessons_text += f" (Not: {lesson['note']})"
     
-    email_body = f"""
+    return f"""
     Sayın {student.get('guardian_name', 'Veli')},
     
-    {student['full_name']} için {start_date} - {end_date} tarih aralığındaki rapor:
+    {student['full_name']} için {data['start_date']} - {data['end_date']} tarih aralığındaki rapor:
     
     DERSLER:{lessons_text if lessons_text else " Henüz ders kaydı yok"}
     
@@ -1456,23 +3273,119 @@ async def email_report(student_id: str, start_date: str = Query(...), end_date:
     Detaylı rapor için lütfen öğretmeniniz ile iletişime geçin.
     
     Saygılarımızla,
-    {current_user.full_name}
+    {teacher_name}
     Mentra
     """
+
+def _report_email_subject(student: dict) -> str:
+    return f"Mentra - {student['full_name']} Öğrenci Raporu"
+
+@api_router.post("/reports/email/batch")
+async def email_report_batch(payload: ReportBulkRequest, current_user: User = Depends(get_current_user)):
+    """
+    Queue the report email for every guardian of the teacher (or the listed
+    students) as one batch. Data comes from a few $in queries; the outbox
+    worker then sends the whole batch over its single SMTP connection,
+    throttled, and each message's outbox entry is the per-recipient status.
+    """
+    query = {'teacher_id': current_user.id}
+    if payload.student_ids is not None:
+        query['id'] = {'$in': payload.student_ids}
+    students = await db.students.find(query, {'_id': 0}).sort('full_name', 1).to_list(None)
+    if not students:
+        raise HTTPException(status_code=404, detail="Öğrenci bulunamadı")
+    
+    recipients = [student for student in students if student.get('guardian_email')]
+    skipped = [
+        {'student_id': student['id'], 'student_name': student['full_name'], 'reason': 'Veli email adresi yok'}
+        for student in students if not student.get('guardian_email')
+    ]
+    if not recipients:
+        raise HTTPException(status_code=400, detail="Veli email adresi olan öğrenci yok")
+    
+    data = await _load_bulk_report_data(current_user.id, recipients, payload.start_date, payload.end_date)
+    batch_id = str(uuid.uuid4())
+    outbox_docs = [
+        _outbox_doc(
+            subject=_report_email_subject(student),
+            recipients=[student['guardian_email']],
+            body=_report_email_body(data[student['id']], current_user.full_name),
+            subtype="plain",
+            priority=EMAIL_PRIORITY_BULK,
+            teacher_id=current_user.id,
+            student_id=student['id'],
+            batch_id=batch_id
+        )
+        for student in recipients
+    ]
+    
+    batch_doc = {
+        'id': batch_id,
+        'teacher_id': current_user.id,
+        'start_date': payload.start_date,
+        'end_date': payload.end_date,
+        'total': len(outbox_docs),
+        'skipped': skipped,
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }
+    await db.email_batches.insert_one(batch_doc)
+    await enqueue_emails(outbox_docs)
     
-    message = MessageSchema(
-        subject=f"Mentra - {student['full_name']} Öğrenci Raporu",
+    return {
+        "message": f"{len(outbox_docs)} rapor veliye email ile gönderilmek üzere sıraya alındı",
+        "batch_id": batch_id,
+        "queued": len(outbox_docs),
+        "skipped": skipped
+    }
+
+@api_router.get("/reports/email/batch/{batch_id}")
+async def get_email_report_batch(batch_id: str, current_user: User = Depends(get_current_user)):
+    batch = await db.email_batches.find_one({'id': batch_id, 'teacher_id': current_user.id}, {'_id': 0})
+    if not batch:
+        raise HTTPException(status_code=404, detail="Gönderim bulunamadı")
+    
+    items = await db.email_outbox.find(
+        {'batch_id': batch_id},
+        {'_id': 0, 'id': 1, 'student_id': 1, 'recipients': 1, 'status': 1, 'attempts': 1, 'last_error': 1, 'sent_at': 1}
+    ).to_list(None)
+    counts = {'pending': 0, 'sending': 0, 'sent': 0, 'dead': 0}
+    for item in items:
+        counts[item['status']] = counts.get(item['status'], 0) + 1
+    
+    batch['counts'] = counts
+    batch['done'] = counts['pending'] == 0 and counts['sending'] == 0
+    batch['recipients'] = [
+        {
+            'outbox_id': item['id'],
+            'student_id': item.get('student_id'),
+            'email': item['recipients'][0] if item.get('recipients') else None,
+            'status': item['status'],
+            'attempts': item.get('attempts', 0),
+            'last_error': item.get('last_error'),
+            'sent_at': item.get('sent_at')
+        }
+        for item in items
+    ]
+    return batch
+
+@api_router.post("/reports/email/{student_id}")
+async def email_report(student_id: str, start_date: str = Query(...), end_date: str = Query(...),
+                      current_user: User = Depends(get_current_user)):
+    data = await _load_report_data(current_user.id, student_id, start_date, end_date)
+    if not data or not data['student'].get('guardian_email'):
+        raise HTTPException(status_code=400, detail="Öğrenci bulunamadı veya veli email adresi yok")
+    student = data['student']
+    
+    outbox_id = await enqueue_email(
+        subject=_report_email_subject(student),
         recipients=[student['guardian_email']],
-        body=email_body,
-        subtype="plain"
+        body=_report_email_body(data, current_user.full_name),
+        subtype="plain",
+        teacher_id=current_user.id,
+        student_id=student_id
     )
     
-    try:
-        await fastmail.send_message(message)
-        return {"message": "Rapor veliye email ile gönderildi"}
-    except Exception as e:
-        logger.error(f"Email gönderme hatası: {e}")
-        raise HTTPException(status_code=500, detail="Email gönderilemedi")
+    return {"message": "Rapor veliye email ile gönderilmek üzere sıraya alındı", "outbox_id": outbox_id}
 
 # ============ SOCIAL FEATURES ============
 
@@ -1485,6 +3398,8 @@ async def create_post(post_data: PostCreate, current_user: User = Depends(get_cu
     post_dict['author_name'] = current_user.full_name
     post_dict['author_username'] = current_user.username
     post_dict['author_avatar'] = current_user.avatar
+    post_dict['likes_count'] = 0
+    post_dict['comments_count'] = 0
     post_dict['created_at'] = datetime.now(timezone.utc).isoformat()
     
     await db.posts.insert_one(post_dict)
@@ -1516,30 +3431,59 @@ async def delete_post(post_id: str, current_user: User = Depends(get_current_use
     return {"message": "Post silindi"}
 
 # Feed (Posts + News)
+def _feed_branch(match: dict, sort_field: str, item_type: str, after: Optional[dict], limit: int) -> list:
+    if after:
+        match = {**match, '$or': [
+            {sort_field: {'$lt': after['sort_at']}},
+            {sort_field: after['sort_at'], 'id': {'$lt': after['id']}}
+        ]}
+    return [
+        {'$match': match},
+        {'$sort': {sort_field: -1, 'id': -1}},
+        {'$limit': limit},
+        {'$addFields': {
+            'type': item_type,
+            'sort_at': f"${sort_field}",
+            'likes_count': {'$ifNull': ['$likes_count', 0]},
+            'comments_count': {'$ifNull': ['$comments_count', 0]}
+        }}
+    ]
+
 @api_router.get("/feed")
-async def get_feed(type: str = "all", limit: int = 20, current_user: User = Depends(get_current_user)):
-    feed_items = []
-    
-    if type in ["all", "posts"]:
-        posts = await db.posts.find({}, {'_id': 0}).sort('created_at', -1).limit(limit).to_list(limit)
-        for post in posts:
-            # Get likes and comments count
-            likes_count = await db.likes.count_documents({'post_id': post['id']})
-            comments_count = await db.comments.count_documents({'post_id': post['id']})
-            feed_items.append({**post, 'type': 'post', 'likes_count': likes_count, 'comments_count': comments_count})
-    
-    if type in ["all", "news"]:
-        news = await db.news.find({'status': 'published'}, {'_id': 0}).sort('published_at', -1).limit(limit).to_list(limit)
-        for item in news:
-            # Get likes and comments count for news
-            likes_count = await db.likes.count_documents({'news_id': item['id']})
-            comments_count = await db.comments.count_documents({'news_id': item['id']})
-            feed_items.append({**item, 'type': 'news', 'likes_count': likes_count, 'comments_count': comments_count})
-    
-    # Sort by date
-    feed_items.sort(key=lambda x: x.get('created_at') or x.get('published_at'), reverse=True)
-    
-    return feed_items[:limit]
+async def get_feed(response: Response, type: str = "all", limit: int = Query(20, ge=1, le=100),
+                   cursor: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    after = _decode_cursor(cursor) if cursor else None
+    
+    # Each branch is sorted and limited on its own index before the union,
+    # so the merged sort never sees more than 2 * (limit + 1) documents
+    posts_pipeline = _feed_branch({}, 'created_at', 'post', after, limit + 1)
+    news_pipeline = _feed_branch({'status': 'published'}, 'published_at', 'news', after, limit + 1)
+    
+    if type == "all":
+        collection = db.posts
+        pipeline = posts_pipeline + [{'$unionWith': {'coll': 'news', 'pipeline': news_pipeline}}]
+    elif type == "posts":
+        collection, pipeline = db.posts, posts_pipeline
+    elif type == "news":
+        collection, pipeline = db.news, news_pipeline
+    else:
+        return []
+    
+    pipeline += [
+        {'$sort': {'sort_at': -1, 'id': -1}},
+        {'$limit': limit + 1},
+        {'$project': {'_id': 0}}
+    ]
+    feed_items = await collection.aggregate(pipeline).to_list(limit + 1)
+    
+    if len(feed_items) > limit:
+        feed_items = feed_items[:limit]
+        last = feed_items[-1]
+        response.headers['X-Next-Cursor'] = _encode_cursor({'sort_at': last['sort_at'], 'id': last['id']})
+    
+    for item in feed_items:
+        item.pop('sort_at', None)
+    return feed_items
 
 # Search Users
 @api_router.get("/search/users")
@@ -1614,6 +3558,7 @@ async def update_profile(bio: Optional[str] = None, current_user: User = Depends
     
     if update_data:
         await db.users.update_one({'id': current_user.id}, {'$set': update_data})
+        user_cache.invalidate(current_user.id)
     
     updated_user = await db.users.find_one({'id': current_user.id}, {'_id': 0, 'password': 0})
     return updated_user
@@ -1789,6 +3734,8 @@ async def create_news(news_data: NewsCreate, current_user: User = Depends(get_cu
     news_dict['id'] = str(uuid.uuid4())
     news_dict['author_id'] = current_user.id
     news_dict['published_at'] = datetime.now(timezone.utc).isoformat() if news_dict['status'] == 'published' else None
+    news_dict['likes_count'] = 0
+    news_dict['comments_count'] = 0
     news_dict['created_at'] = datetime.now(timezone.utc).isoformat()
     news_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
     
@@ -1843,7 +3790,9 @@ async def like_post(post_id: str, current_user: User = Depends(get_current_user)
     existing = await db.likes.find_one({'post_id': post_id, 'user_id': current_user.id})
     if existing:
         # Unlike
-        await db.likes.delete_one({'post_id': post_id, 'user_id': current_user.id})
+        result = await db.likes.delete_one({'post_id': post_id, 'user_id': current_user.id})
+        if result.deleted_count:
+            await db.posts.update_one({'id': post_id}, {'$inc': {'likes_count': -1}})
         return {"message": "Beğeni kaldırıldı", "liked": False}
     
     # Like
@@ -1857,7 +3806,7 @@ async def like_post(post_id: str, current_user: User = Depends(get_current_user)
     await db.likes.insert_one(like_dict)
     
     # Create notification for post author
-    post = await db.posts.find_one({'id': post_id})
+    post = await db.posts.find_one_and_update({'id': post_id}, {'$inc': {'likes_count': 1}})
     if post and post['author_id'] != current_user.id:
         notification_dict = {
             'id': str(uuid.uuid4()),
@@ -1895,7 +3844,7 @@ async def create_comment(post_id: str, comment: CommentBase, current_user: User
     await db.comments.insert_one(comment_dict)
     
     # Create notification for post author
-    post = await db.posts.find_one({'id': post_id})
+    post = await db.posts.find_one_and_update({'id': post_id}, {'$inc': {'comments_count': 1}})
     if post and post['author_id'] != current_user.id:
         notification_dict = {
             'id': str(uuid.uuid4()),
@@ -1921,9 +3870,14 @@ async def get_post_comments(post_id: str):
 
 @api_router.delete("/comments/{comment_id}")
 async def delete_comment(comment_id: str, current_user: User = Depends(get_current_user)):
-    result = await db.comments.delete_one({'id': comment_id, 'user_id': current_user.id})
-    if result.deleted_count == 0:
+    comment = await db.comments.find_one_and_delete({'id': comment_id, 'user_id': current_user.id})
+    if not comment:
         raise HTTPException(status_code=404, detail="Yorum bulunamadı")
+    
+    if comment.get('post_id'):
+        await db.posts.update_one({'id': comment['post_id']}, {'$inc': {'comments_count': -1}})
+    elif comment.get('news_id'):
+        await db.news.update_one({'id': comment['news_id']}, {'$inc': {'comments_count': -1}})
     return {"message": "Yorum silindi"}
 
 # News Likes & Comments
@@ -1934,7 +3888,9 @@ async def like_news(news_id: str, current_user: User = Depends(get_current_user)
     
     if existing:
         # Unlike
-        await db.likes.delete_one({'user_id': current_user.id, 'news_id': news_id})
+        result = await db.likes.delete_one({'user_id': current_user.id, 'news_id': news_id})
+        if result.deleted_count:
+            await db.news.update_one({'id': news_id}, {'$inc': {'likes_count': -1}})
         return {"message": "Beğeni kaldırıldı"}
     
     # Like
@@ -1948,6 +3904,7 @@ async def like_news(news_id: str, current_user: User = Depends(get_current_user)
         'created_at': datetime.now(timezone.utc).isoformat()
     }
     await db.likes.insert_one(like_dict)
+    await db.news.update_one({'id': news_id}, {'$inc': {'likes_count': 1}})
     return {"message": "Beğenildi"}
 
 @api_router.get("/news/{news_id}/likes")
@@ -1968,6 +3925,7 @@ async def create_news_comment(news_id: str, comment: CommentCreate, current_user
         'created_at': datetime.now(timezone.utc).isoformat()
     }
     await db.comments.insert_one(comment_dict)
+    await db.news.update_one({'id': news_id}, {'$inc': {'comments_count': 1}})
     return Comment(**comment_dict)
 
 @api_router.get("/news/{news_id}/comments")
@@ -1975,6 +3933,56 @@ async def get_news_comments(news_id: str):
     comments = await db.comments.find({'news_id': news_id}, {'_id': 0}).sort('created_at', 1).to_list(1000)
     return [Comment(**c) for c in comments]
 
+# ---------- Engagement counter reconciliation ----------
+
+async def _count_by(collection, field: str) -> dict:
+    pipeline = [
+        {'$match': {field: {'$type': 'string'}}},
+        {'$group': {'_id': f"${field}", 'count': {'$sum': 1}}}
+    ]
+    return {row['_id']: row['count'] async for row in collection.aggregate(pipeline)}
+
+async def reconcile_engagement_counters(database, batch_size: int = 1000) -> dict:
+    """
+    Recompute likes_count/comments_count on posts and news from the likes and
+    comments collections and fix drifted (or missing) counters in bulk.
+    """
+    fixed = {}
+    for target, field in (('posts', 'post_id'), ('news', 'news_id')):
+        likes = await _count_by(database.likes, field)
+        comments = await _count_by(database.comments, field)
+        operations = []
+        fixed[target] = 0
+        cursor = database[target].find({}, {'_id': 0, 'id': 1, 'likes_count': 1, 'comments_count': 1})
+        async for doc in cursor:
+            expected = {'likes_count': likes.get(doc['id'], 0), 'comments_count': comments.get(doc['id'], 0)}
+            if doc.get('likes_count') != expected['likes_count'] or doc.get('comments_count') != expected['comments_count']:
+                operations.append(UpdateOne({'id': doc['id']}, {'$set': expected}))
+            if len(operations) >= batch_size:
+                await database[target].bulk_write(operations, ordered=False)
+                fixed[target] += len(operations)
+                operations = []
+        if operations:
+            await database[target].bulk_write(operations, ordered=False)
+            fixed[target] += len(operations)
+    return fixed
+
+@api_router.post("/admin/maintenance/archive-overrides")
+async def archive_overrides(current_user: User = Depends(get_current_user)):
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin yetkisi gerekli")
+    
+    archived = await archive_lesson_overrides(db, OVERRIDE_ARCHIVE_BATCH_SIZE)
+    return {"message": "Eski erteleme kayıtları arşivlendi", "archived": archived, "cutoff_week": _override_archive_cutoff()}
+
+@api_router.post("/admin/maintenance/reconcile-counters")
+async def reconcile_counters(current_user: User = Depends(get_current_user)):
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin yetkisi gerekli")
+    
+    fixed = await reconcile_engagement_counters(db)
+    return {"message": "Sayaçlar güncellendi", "fixed": fixed}
+
 # ============ NOTIFICATIONS ============
 
 @api_router.get("/notifications")
@@ -2006,6 +4014,377 @@ async def get_unread_count(current_user: User = Depends(get_current_user)):
     count = await db.notifications.count_documents({'user_id': current_user.id, 'read': False})
     return {"count": count}
 
+# ============ ADMIN AVAILABILITY ============
+
+def _bucket_range(start_min: int, end_min: int):
+    # Buckets touched by [start, end): floor the start, ceil the end
+    return start_min // AVAILABILITY_BUCKET_MINUTES, -(-end_min // AVAILABILITY_BUCKET_MINUTES)
+
+class _AvailabilityIndex:
+    """
+    Weekly occupancy of every teacher as one boolean array shaped
+    (teachers, 7 weekdays, buckets per day). Built with a single lessons
+    scan; teachers whose schedule changes in this process are marked stale
+    and only their rows are reloaded on the next search. The TTL bounds
+    staleness from other API processes.
+    """
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.row_of = {}  # teacher_id -> row
+        self.occupancy = np.zeros((0, 7, AVAILABILITY_BUCKETS), dtype=bool)
+        self.loaded_at = 0.0
+        self._stale = set()
+        self._lock = asyncio.Lock()
+        self.rebuilds = 0
+        self.refreshes = 0
+
+    def mark_stale(self, teacher_id: str) -> None:
+        self._stale.add(teacher_id)
+
+    @staticmethod
+    def _paint(occupancy: np.ndarray, rows: np.ndarray, days: np.ndarray,
+               starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        # +1 at each interval start and -1 at its end; a running sum > 0 is busy
+        diff = np.zeros((occupancy.shape[0], 7, AVAILABILITY_BUCKETS + 1), dtype=np.int32)
+        np.add.at(diff, (rows, days, starts), 1)
+        np.add.at(diff, (rows, days, ends), -1)
+        return occupancy | (np.cumsum(diff, axis=2)[:, :, :AVAILABILITY_BUCKETS] > 0)
+
+    def _lesson_arrays(self, lessons: List[dict]):
+        rows, days, starts, ends = [], [], [], []
+        for lesson in lessons:
+            row = self.row_of.get(lesson['teacher_id'])
+            day = lesson.get('day_of_week')
+            if row is None or day is None or not 0 <= day <= 6:
+                continue
+            start, end = _bucket_range(lesson['start_min'], lesson['end_min'])
+            if end <= start:
+                continue
+            rows.append(row)
+            days.append(day)
+            starts.append(max(start, 0))
+            ends.append(min(end, AVAILABILITY_BUCKETS))
+        return np.array(rows, dtype=np.intp), np.array(days, dtype=np.intp), np.array(starts, dtype=np.intp), np.array(ends, dtype=np.intp)
+
+    async def _rebuild(self, teacher_ids: List[str]) -> None:
+        self._stale.clear()
+        lessons = await db.lessons.find(
+            {'teacher_id': {'$in': teacher_ids}}, {'_id': 0, 'teacher_id': 1, 'day_of_week': 1, 'start_min': 1, 'end_min': 1}
+        ).to_list(None)
+        self.row_of = {teacher_id: row for row, teacher_id in enumerate(teacher_ids)}
+        self.occupancy = self._paint(np.zeros((len(teacher_ids), 7, AVAILABILITY_BUCKETS), dtype=bool),
+                                     *self._lesson_arrays(lessons))
+        self.loaded_at = time.monotonic()
+        self.rebuilds += 1
+
+    async def _refresh(self) -> None:
+        stale = [teacher_id for teacher_id in self._stale if teacher_id in self.row_of]
+        self._stale.clear()
+        lessons = await db.lessons.find(
+            {'teacher_id': {'$in': stale}}, {'_id': 0, 'teacher_id': 1, 'day_of_week': 1, 'start_min': 1, 'end_min': 1}
+        ).to_list(None)
+        occupancy = self.occupancy.copy()
+        occupancy[[self.row_of[teacher_id] for teacher_id in stale]] = False
+        self.occupancy = self._paint(occupancy, *self._lesson_arrays(lessons))
+        self.refreshes += 1
+
+    async def snapshot(self, teacher_ids: List[str]):
+        """Current (row_of, occupancy); teacher_ids are every searchable teacher."""
+        async with self._lock:
+            expired = self.loaded_at + self.ttl_seconds <= time.monotonic()
+            if expired or any(teacher_id not in self.row_of for teacher_id in teacher_ids):
+                await self._rebuild(teacher_ids)
+            elif self._stale:
+                await self._refresh()
+            return self.row_of, self.occupancy
+
+    def stats(self) -> dict:
+        return {
+            "teachers": len(self.row_of),
+            "bucket_minutes": AVAILABILITY_BUCKET_MINUTES,
+            "bytes": int(self.occupancy.nbytes),
+            "rebuilds": self.rebuilds,
+            "refreshes": self.refreshes
+        }
+
+availability_index = _AvailabilityIndex(SCHEDULE_INDEX_TTL_SECONDS)
+
+@api_router.post("/admin/availability")
+async def search_availability(payload: AvailabilityQuery, current_user: User = Depends(get_current_user)):
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin yetkisi gerekli")
+    if payload.match not in ('all', 'any'):
+        raise HTTPException(status_code=400, detail="match 'all' veya 'any' olmalı")
+    
+    # Slot -> (weekday, bucket range, date); dated slots also see overrides
+    # moved onto that date and weekly lessons moved away from it
+    slots = []
+    for slot in payload.slots:
+        try:
+            weekday = (datetime.strptime(slot.date, "%Y-%m-%d").weekday()
+                       if slot.date else slot.day_of_week)
+            start_min, end_min = _to_minutes(slot.start_time), _to_minutes(slot.end_time)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Geçersiz tarih veya saat formatı")
+        if weekday is None or end_min <= start_min:
+            raise HTTPException(status_code=400, detail="Her aralık için gün veya tarih ve geçerli bir saat aralığı gerekli")
+        slots.append((weekday, *_bucket_range(start_min, end_min), slot.date))
+    
+    teacher_query = {'role': {'$ne': 'admin'}}
+    if payload.subject:
+        teacher_query['subject'] = {'$regex': re.escape(payload.subject), '$options': 'i'}
+    teachers = await db.users.find(
+        teacher_query, {'_id': 0, 'id': 1, 'full_name': 1, 'username': 1, 'subject': 1}
+    ).to_list(None)
+    if not teachers:
+        return {"match": payload.match, "count": 0, "teachers": []}
+    all_teacher_ids = [t['id'] for t in await db.users.find({'role': {'$ne': 'admin'}}, {'_id': 0, 'id': 1}).to_list(None)] \
+        if payload.subject else [t['id'] for t in teachers]
+    row_of, occupancy = await availability_index.snapshot(all_teacher_ids)
+    rows = np.array([row_of[t['id']] for t in teachers], dtype=np.intp)
+    
+    dates = sorted({slot[3] for slot in slots if slot[3]})
+    week_keys = sorted({_iso_week_key(d) for d in dates})
+    overrides = await _find_overrides(
+        {'teacher_id': {'$in': [t['id'] for t in teachers]}, '$or': [
+            {'new_date': {'$in': dates}},
+            {'week_key': {'$in': week_keys}, 'original_date': {'$in': dates}}
+        ]},
+        {'_id': 0, 'teacher_id': 1, 'lesson_id': 1, 'original_date': 1, 'new_date': 1,
+         'new_start_min': 1, 'new_end_min': 1},
+        week_keys
+    ) if dates else []
+    position = {t['id']: i for i, t in enumerate(teachers)}
+    
+    # Lessons moved away from a date no longer occupy it; the bitmap cannot
+    # tell them apart, so those teachers' weekly lessons are re-checked
+    moved_away = {}  # date -> lesson ids
+    for ov in overrides:
+        if ov.get('original_date') in dates:
+            moved_away.setdefault(ov['original_date'], set()).add(ov['lesson_id'])
+    moved_teachers = {ov['teacher_id'] for ov in overrides if ov.get('original_date') in dates}
+    weekly_lessons = await db.lessons.find(
+        {'teacher_id': {'$in': list(moved_teachers)}},
+        {'_id': 0, 'id': 1, 'teacher_id': 1, 'day_of_week': 1, 'start_min': 1, 'end_min': 1}
+    ).to_list(None) if moved_teachers else []
+    
+    # free[t, s]: teacher t has no busy bucket inside slot s
+    free = np.empty((len(teachers), len(slots)), dtype=bool)
+    for s, (weekday, start, end, date_str) in enumerate(slots):
+        busy = occupancy[rows, weekday, start:end].any(axis=1)
+        if date_str in moved_away:
+            skipped = moved_away[date_str]
+            for teacher_id in moved_teachers:
+                busy[position[teacher_id]] = False
+            for lesson in weekly_lessons:
+                if lesson['day_of_week'] == weekday and lesson['id'] not in skipped:
+                    lesson_start, lesson_end = _bucket_range(lesson['start_min'], lesson['end_min'])
+                    if lesson_start < end and lesson_end > start:
+                        busy[position[lesson['teacher_id']]] = True
+        for ov in overrides:
+            if ov['new_date'] == date_str:
+                ov_start, ov_end = _bucket_range(ov['new_start_min'], ov['new_end_min'])
+                if ov_start < end and ov_end > start:
+                    busy[position[ov['teacher_id']]] = True
+        free[:, s] = ~busy
+    matched = free.all(axis=1) if payload.match == 'all' else free.any(axis=1)
+    
+    results = []
+    for i in np.flatnonzero(matched):
+        teacher = teachers[i]
+        results.append({
+            "teacher_id": teacher['id'],
+            "full_name": teacher.get('full_name'),
+            "username": teacher.get('username'),
+            "subject": teacher.get('subject'),
+            "free_slots": np.flatnonzero(free[i]).tolist()
+        })
+    return {"match": payload.match, "count": len(results), "teachers": results}
+
+# ============ INDEXES ============
+
+# Every query shape in this module, by collection. Applied idempotently at
+# startup and compared against the live indexes by build_index_report().
+INDEX_REGISTRY = {
+    'users': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('email', 1)], 'unique': True},
+        {'keys': [('username', 1)], 'unique': True,
+         'partialFilterExpression': {'username': {'$type': 'string'}}},
+        {'keys': [('calendar_token', 1)], 'unique': True,
+         'partialFilterExpression': {'calendar_token': {'$type': 'string'}}},
+    ],
+    'students': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('teacher_id', 1), ('created_at', 1), ('id', 1)]},
+    ],
+    'lessons': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('teacher_id', 1), ('day_of_week', 1), ('start_min', 1), ('end_min', 1)]},
+        {'keys': [('teacher_id', 1), ('hold.day_of_week', 1), ('hold.start_min', 1), ('hold.end_min', 1)],
+         'partialFilterExpression': {'hold.day_of_week': {'$exists': True}}},
+        {'keys': [('teacher_id', 1), ('created_at', 1), ('id', 1)]},
+        {'keys': [('teacher_id', 1), ('student_id', 1), ('created_at', 1), ('id', 1)]},
+    ],
+    'lesson_overrides': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('lesson_id', 1), ('week_key', 1)], 'unique': True},
+        {'keys': [('teacher_id', 1), ('new_date', 1), ('new_start_min', 1), ('new_end_min', 1)]},
+        {'keys': [('teacher_id', 1), ('week_key', 1)]},
+        {'keys': [('week_key', 1)]},
+    ],
+    'lesson_overrides_archive': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('lesson_id', 1), ('week_key', 1)], 'unique': True},
+        {'keys': [('teacher_id', 1), ('new_date', 1), ('new_start_min', 1), ('new_end_min', 1)]},
+        {'keys': [('teacher_id', 1), ('week_key', 1)]},
+    ],
+    'sessions': [
+        {'keys': [('teacher_id', 1), ('student_id', 1), ('date', 1)]},
+        {'keys': [('teacher_id', 1), ('created_at', 1), ('id', 1)]},
+        {'keys': [('teacher_id', 1), ('student_id', 1), ('created_at', 1), ('id', 1)]},
+    ],
+    'payments': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('teacher_id', 1), ('student_id', 1), ('date', 1), ('status', 1), ('amount', 1)]},
+        {'keys': [('teacher_id', 1), ('status', 1), ('amount', 1)]},
+        {'keys': [('teacher_id', 1), ('created_at', 1), ('id', 1)]},
+        {'keys': [('teacher_id', 1), ('student_id', 1), ('created_at', 1), ('id', 1)]},
+    ],
+    'posts': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('created_at', -1), ('id', -1)]},
+        {'keys': [('author_id', 1), ('created_at', -1)]},
+    ],
+    'news': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('status', 1), ('published_at', -1), ('id', -1)]},
+        {'keys': [('created_at', -1)]},
+    ],
+    'likes': [
+        {'keys': [('post_id', 1), ('user_id', 1)]},
+        {'keys': [('news_id', 1), ('user_id', 1)]},
+    ],
+    'comments': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('post_id', 1), ('created_at', 1)]},
+        {'keys': [('news_id', 1), ('created_at', 1)]},
+    ],
+    'follows': [
+        {'keys': [('follower_id', 1), ('followed_id', 1)], 'unique': True},
+        {'keys': [('followed_id', 1)]},
+    ],
+    'threads': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('participants', 1), ('last_message_at', -1)]},
+    ],
+    'messages': [
+        {'keys': [('thread_id', 1), ('created_at', 1)]},
+    ],
+    'email_outbox': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('status', 1), ('priority', 1), ('next_attempt_at', 1)]},
+        {'keys': [('expires_at', 1)], 'expireAfterSeconds': 0},  # set once sent or dead
+        {'keys': [('batch_id', 1)], 'partialFilterExpression': {'batch_id': {'$type': 'string'}}},
+    ],
+    'email_batches': [
+        {'keys': [('id', 1)], 'unique': True},
+    ],
+    'notifications': [
+        {'keys': [('id', 1)], 'unique': True},
+        {'keys': [('user_id', 1), ('created_at', -1)]},
+        {'keys': [('user_id', 1), ('read', 1), ('created_at', -1)]},
+    ],
+}
+
+def _index_key(keys) -> tuple:
+    return tuple((field, int(direction)) for field, direction in keys)
+
+async def apply_index_registry(database) -> None:
+    for collection_name, specs in INDEX_REGISTRY.items():
+        for spec in specs:
+            options = {k: v for k, v in spec.items() if k != 'keys'}
+            try:
+                await database[collection_name].create_index(spec['keys'], **options)
+            except Exception as e:
+                logger.warning(f"Index creation warning ({collection_name} {spec['keys']}): {e}")
+
+async def build_index_report(database) -> dict:
+    """
+    Compare INDEX_REGISTRY with the live indexes of every collection:
+    - missing: registered but not present
+    - unregistered: present but not in the registry
+    - redundant: non-unique index whose keys are a prefix of another index
+    - unused: no accesses in $indexStats since the last mongod restart
+    """
+    report = {}
+    collection_names = set(INDEX_REGISTRY) | set(await database.list_collection_names())
+    for collection_name in sorted(collection_names):
+        collection = database[collection_name]
+        registered = [_index_key(spec['keys']) for spec in INDEX_REGISTRY.get(collection_name, [])]
+        live = await collection.index_information()
+        live_keys = {name: _index_key(info['key']) for name, info in live.items() if name != '_id_'}
+
+        try:
+            usage = {
+                stat['name']: stat['accesses']
+                async for stat in collection.aggregate([{'$indexStats': {}}])
+            }
+        except Exception as e:
+            logger.warning(f"$indexStats unavailable for {collection_name}: {e}")
+            usage = {}
+
+        redundant = []
+        for name, key in live_keys.items():
+            info = live[name]
+            if info.get('unique') or info.get('partialFilterExpression') or 'expireAfterSeconds' in info:
+                continue
+            covered_by = [other_name for other_name, other in live_keys.items()
+                          if len(other) > len(key) and other[:len(key)] == key]
+            if covered_by:
+                redundant.append({'name': name, 'covered_by': covered_by})
+
+        entry = {
+            'missing': [dict(key) for key in registered if key not in live_keys.values()],
+            'unregistered': [name for name, key in live_keys.items() if key not in registered],
+            'redundant': redundant,
+            'unused': [{'name': name, 'since': usage[name]['since'].isoformat()}
+                       for name in live_keys if name in usage and usage[name]['ops'] == 0]
+        }
+        if any(entry.values()):
+            report[collection_name] = entry
+    return report
+
+@api_router.get("/admin/indexes/report")
+async def get_index_report(current_user: User = Depends(get_current_user)):
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin yetkisi gerekli")
+    
+    return await build_index_report(db)
+
+# ============ ADMIN METRICS ============
+
+@api_router.get("/admin/metrics")
+async def get_metrics(current_user: User = Depends(get_current_user)):
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Admin yetkisi gerekli")
+    
+    return {
+        "user_cache": user_cache.stats(),
+        "password_hashing": password_executor.stats(),
+        "email_outbox": email_outbox_worker.stats(),
+        "schedule_index": schedule_index.stats(),
+        "schedule_booking": schedule_booker.stats(),
+        "ics_feed": ics_feed_cache.stats(),
+        "override_archive": override_archive_stats,
+        "availability_index": availability_index.stats(),
+        "report_rendering": {
+            "pool": report_pdf_executor.stats(),
+            "per_teacher": report_render_limiter.stats(),
+            "cache": report_cache.stats()
+        }
+    }
+
 # ============ SETUP ============
 
 app.mount("/static", StaticFiles(directory=str(ROOT_DIR / "static")), name="static")
@@ -2017,16 +4396,62 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 @app.on_event("startup")
 async def ensure_indexes():
+    await apply_index_registry(db)
+
+@app.on_event("startup")
+async def ensure_schedule_minutes():
     try:
-        await db.lesson_overrides.create_index([("lesson_id", 1), ("week_key", 1)], unique=True)
-        await db.lesson_overrides.create_index([("teacher_id", 1), ("new_date", 1)])
+        await backfill_schedule_minutes(db)
     except Exception as e:
-        logger.warning(f"Index creation warning: {e}")
+        logger.warning(f"Lesson minute backfill failed: {e}")
+
+@app.on_event("startup")
+async def backfill_engagement_counters():
+    # One-off full reconciliation for data that predates the counters: the
+    # first process to claim the marker runs it, once per database. Later
+    # drift is fixed with /admin/maintenance/reconcile-counters.
+    try:
+        await db.migrations.insert_one({'_id': 'engagement_counters', 'started_at': datetime.now(timezone.utc).isoformat()})
+    except DuplicateKeyError:
+        return
+    except Exception as e:
+        logger.warning(f"Engagement counter backfill skipped: {e}")
+        return
+    
+    async def _run():
+        try:
+            fixed = await reconcile_engagement_counters(db)
+            await db.migrations.update_one(
+                {'_id': 'engagement_counters'},
+                {'$set': {'completed_at': datetime.now(timezone.utc).isoformat(), 'fixed': fixed}}
+            )
+            logger.info(f"Engagement counters reconciled: {fixed}")
+        except Exception as e:
+            await db.migrations.delete_one({'_id': 'engagement_counters'})  # retry on the next startup
+            logger.warning(f"Engagement counter reconciliation failed: {e}")
+    asyncio.create_task(_run())
+
+@app.on_event("startup")
+async def start_email_outbox_worker():
+    if EMAIL_OUTBOX_ENABLED:
+        app.state.email_outbox_task = asyncio.create_task(email_outbox_worker.run())
+
+@app.on_event("startup")
+async def start_override_archiver():
+    if OVERRIDE_ARCHIVE_ENABLED:
+        app.state.override_archive_task = asyncio.create_task(_run_override_archiver())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if getattr(app.state, 'email_outbox_task', None):
+        app.state.email_outbox_task.cancel()
+    if getattr(app.state, 'override_archive_task', None):
+        app.state.override_archive_task.cancel()
+    client.close()
+    password_executor.executor.shutdown(wait=False)
+    report_pdf_executor.executor.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
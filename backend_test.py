@@ -1,7 +1,10 @@
 import requests
 import sys
+import io
+import zipfile
 import json
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 class MentraAPITester:
     def __init__(self, base_url="https://mentra-social.preview.emergentagent.com/api"):
@@ -268,6 +271,173 @@ class MentraAPITester:
             200
         )
 
+    def test_bulk_lessons(self):
+        """Test bulk lesson creation: created, conflicting and invalid slots in one request"""
+        print("\n" + "="*50)
+        print("TESTING BULK LESSON CREATION")
+        print("="*50)
+        
+        if not self.student_id or not self.lesson_id:
+            self.log_test("Bulk Lessons", False, "No student or lesson ID available")
+            return
+        
+        def slot(day, start, end):
+            return {"student_id": self.student_id, "day_of_week": day, "start_time": start, "end_time": end,
+                    "topic": "Toplu ders testi"}
+        
+        response = self.run_test(
+            "Create Lessons in Bulk",
+            "POST",
+            "lessons/bulk",
+            200,
+            data={"lessons": [
+                slot(4, "09:00", "10:00"),   # created
+                slot(4, "09:30", "10:30"),   # overlaps the slot above
+                slot(1, "14:30", "15:30"),   # overlaps the lesson from test_lesson_management
+                slot(4, "20:00", "19:00"),   # ends before it starts
+                slot(4, "11:00", "12:00")    # created
+            ]}
+        )
+        if not response:
+            return
+        
+        statuses = [result.get('status') for result in response.get('results', [])]
+        expected = ['created', 'conflict', 'conflict', 'invalid', 'created']
+        self.log_test("Bulk Lessons - Per-slot Results", statuses == expected, f"Expected {expected}, got {statuses}")
+        
+        created_ids = {result['lesson_id'] for result in response['results'] if result.get('status') == 'created'}
+        returned_ids = {lesson['id'] for lesson in response.get('created', [])}
+        self.log_test("Bulk Lessons - Created Lessons Returned", created_ids == returned_ids,
+                      f"{len(created_ids)} created results vs {len(returned_ids)} lessons returned")
+        
+        conflict_with = response['results'][1].get('conflict_with', {})
+        self.log_test("Bulk Lessons - In-batch Conflict Points at Slot 0", conflict_with.get('index') == 0,
+                      f"conflict_with: {conflict_with}")
+        
+        headers = {'Authorization': f'Bearer {self.token}'}
+        for lesson_id in created_ids:
+            requests.delete(f"{self.base_url}/lessons/{lesson_id}", headers=headers)
+
+    def test_complete_batch(self):
+        """Test end-of-day batch completion: duplicates, unknown ids and debt from hourly_rate"""
+        print("\n" + "="*50)
+        print("TESTING BATCH LESSON COMPLETION")
+        print("="*50)
+        
+        if not self.student_id:
+            self.log_test("Complete Batch", False, "No student ID available")
+            return
+        
+        headers = {'Authorization': f'Bearer {self.token}'}
+        student = requests.get(f"{self.base_url}/students/{self.student_id}", headers=headers).json()
+        
+        # 90 minutes, so the debt is 1.5 x hourly_rate
+        lesson = self.run_test(
+            "Create Lesson for Batch Completion",
+            "POST",
+            "lessons",
+            200,
+            data={"student_id": self.student_id, "day_of_week": 4, "start_time": "12:00", "end_time": "13:30",
+                  "topic": "Toplu tamamlama testi"}
+        )
+        if not lesson or 'id' not in lesson:
+            return
+        
+        completion = {"lesson_id": lesson['id'], "topic": "Türev", "weaknesses": "Zincir kuralı", "homework": "Sayfa 42"}
+        response = self.run_test(
+            "Complete Lessons in Batch",
+            "POST",
+            "lessons/complete-batch",
+            200,
+            data={"completions": [completion, completion, {"lesson_id": "olmayan-ders"}]}
+        )
+        
+        if response:
+            statuses = [result.get('status') for result in response.get('results', [])]
+            expected = ['completed', 'duplicate', 'not_found']
+            self.log_test("Complete Batch - Per-item Results", statuses == expected and response.get('completed') == 1,
+                          f"Expected {expected} with 1 completed, got {statuses} with {response.get('completed')}")
+            
+            expected_amount = (student.get('hourly_rate') or 0) * 1.5
+            first = response['results'][0]
+            self.log_test("Complete Batch - Debt from Hourly Rate",
+                          first.get('amount') == expected_amount and response.get('total_amount') == expected_amount,
+                          f"Expected {expected_amount}, got {first.get('amount')} (total {response.get('total_amount')})")
+            
+            if first.get('payment_id'):
+                payments = requests.get(f"{self.base_url}/payments?student_id={self.student_id}", headers=headers).json()
+                payment = next((p for p in payments if p['id'] == first['payment_id']), None)
+                self.log_test("Complete Batch - Payment Recorded",
+                              payment is not None and payment['amount'] == expected_amount and payment['status'] == 'Beklemede',
+                              f"Payment: {payment}")
+                requests.delete(f"{self.base_url}/payments/{first['payment_id']}", headers=headers)
+        
+        requests.delete(f"{self.base_url}/lessons/{lesson['id']}", headers=headers)
+
+    def test_concurrent_booking(self, total_requests=300, workers=50):
+        """Fire hundreds of simultaneous bookings at one teacher; none may overlap"""
+        print("\n" + "="*50)
+        print("TESTING CONCURRENT LESSON BOOKING")
+        print("="*50)
+        
+        if not self.student_id:
+            self.log_test("Concurrent Booking", False, "No student ID available")
+            return
+        
+        headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {self.token}'}
+        existing = requests.get(f"{self.base_url}/lessons", headers=headers).json()
+        existing_ids = {lesson['id'] for lesson in existing}
+        
+        # Deliberately overlapping slots (every 30 minutes, one hour long) on
+        # the weekend, so most requests race for the same time
+        def book(i):
+            day = 5 + i % 2
+            start = 8 * 60 + 30 * ((i // 2) % 12)
+            lesson_data = {
+                "student_id": self.student_id,
+                "day_of_week": day,
+                "start_time": f"{start // 60:02d}:{start % 60:02d}",
+                "end_time": f"{(start + 60) // 60:02d}:{(start + 60) % 60:02d}",
+                "topic": "Eşzamanlılık testi"
+            }
+            try:
+                return requests.post(f"{self.base_url}/lessons", json=lesson_data, headers=headers).status_code
+            except Exception:
+                return None
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            statuses = list(pool.map(book, range(total_requests)))
+        
+        created = statuses.count(200)
+        unexpected = [s for s in statuses if s not in (200, 400)]
+        print(f"   ✓ {created} created, {statuses.count(400)} rejected as conflicts, {len(unexpected)} other")
+        
+        lessons = requests.get(f"{self.base_url}/lessons", headers=headers).json()
+        new_lessons = [l for l in lessons if l['id'] not in existing_ids]
+        
+        def minutes(hhmm):
+            h, m = hhmm.split(':')
+            return int(h) * 60 + int(m)
+        
+        overlaps = 0
+        by_day = {}
+        for lesson in lessons:
+            by_day.setdefault(lesson['day_of_week'], []).append((minutes(lesson['start_time']), minutes(lesson['end_time'])))
+        for intervals in by_day.values():
+            intervals.sort()
+            for (_, prev_end), (next_start, _) in zip(intervals, intervals[1:]):
+                if next_start < prev_end:
+                    overlaps += 1
+        
+        self.log_test(
+            "Concurrent Booking - No Double Booking",
+            overlaps == 0 and created == len(new_lessons) and not unexpected,
+            f"{overlaps} overlapping lessons, {created} created vs {len(new_lessons)} stored, {len(unexpected)} unexpected statuses"
+        )
+        
+        for lesson in new_lessons:
+            requests.delete(f"{self.base_url}/lessons/{lesson['id']}", headers=headers)
+
     def test_lesson_completion_with_debt(self):
         """Test lesson completion with automatic debt creation"""
         print("\n" + "="*50)
@@ -434,6 +604,41 @@ class MentraAPITester:
                 self.log_test("Generate PDF Report", False, f"Status: {response.status_code}")
         except Exception as e:
             self.log_test("Generate PDF Report", False, str(e))
+        
+        # Bulk report: every student's PDF in one streamed ZIP
+        try:
+            url = f"{self.base_url}/reports/bulk"
+            headers = {'Authorization': f'Bearer {self.token}'}
+            response = requests.post(url, json={'start_date': start_date, 'end_date': end_date}, headers=headers, stream=True)
+            
+            if response.status_code == 200:
+                archive = zipfile.ZipFile(io.BytesIO(response.content))
+                names = archive.namelist()
+                valid = bool(names) and all(archive.read(name).startswith(b'%PDF') for name in names)
+                self.log_test("Generate Bulk Reports", valid, "" if valid else "ZIP has no valid PDFs")
+                print(f"   ✓ ZIP with {len(names)} reports, size: {len(response.content)} bytes")
+            else:
+                self.log_test("Generate Bulk Reports", False, f"Status: {response.status_code}")
+        except Exception as e:
+            self.log_test("Generate Bulk Reports", False, str(e))
+        
+        # Batch guardian emails: queued as one job with per-recipient status
+        response = self.run_test(
+            "Queue Batch Report Emails",
+            "POST",
+            "reports/email/batch",
+            200,
+            data={'start_date': start_date, 'end_date': end_date}
+        )
+        if response and response.get('batch_id'):
+            status = self.run_test(
+                "Get Batch Email Status",
+                "GET",
+                f"reports/email/batch/{response['batch_id']}",
+                200
+            )
+            if status:
+                print(f"   ✓ Batch {status.get('counts')}, done: {status.get('done')}")
 
     def test_profile_management(self):
         """Test profile management"""
@@ -1024,6 +1229,9 @@ class MentraAPITester:
         self.test_dashboard()
         self.test_student_crud()
         self.test_lesson_management()
+        self.test_bulk_lessons()
+        self.test_complete_batch()
+        self.test_concurrent_booking()
         self.test_lesson_completion_with_debt()
         self.test_payment_management()
         self.test_session_management()